@@ -1,141 +1,171 @@
-from crewai import Agent, LLM
-from typing import Dict, List
+from collections import ChainMap
+from typing import TYPE_CHECKING, Dict, Iterator, List, Mapping, Optional, Tuple
 import streamlit as st
 from dotenv import load_dotenv
 import os
+from cache import content_hash
+from personas import Persona, PersonaStore, load_default_personas
+from routing import DEFAULT_MODEL
+from runtime import load_crewai
 
+if TYPE_CHECKING:
+    from crewai import Agent, LLM
 
-def _get_llm():
+
+MODEL_NAME = DEFAULT_MODEL
+
+# Immutable persona definitions shared by every session (loaded from personas.json);
+# Agent objects are built from these on demand
+DEFAULT_PERSONAS = load_default_personas()
+
+
+def _get_session_api_key() -> str:
     api_key = st.session_state.get("groq_api_key")
     if not api_key or not api_key.startswith("gsk_"):
         st.error("Authentication Failed. Please login first.")
         st.switch_page("pages/login.py")
         st.stop()
-    return LLM(
-        model="groq/llama-3.1-8b-instant",
-        api_key=api_key.strip()
+    return api_key.strip()
+
+
+@st.cache_resource(show_spinner=False)
+def get_shared_llm(api_key: str, model: str = MODEL_NAME) -> "LLM":
+    """One LLM client per API key and model for the whole process"""
+    return load_crewai().LLM(
+        model=model,
+        api_key=api_key
+    )
+
+
+def _build_agent(persona: Persona, llm: "LLM") -> "Agent":
+    return load_crewai().Agent(
+        name=persona.name,
+        role=persona.role,
+        goal=persona.goal,
+        backstory=persona.backstory,
+        verbose=False,
+        llm=llm,
+        allow_delegation=False
     )
 
 
+@st.cache_resource(show_spinner=False)
+def get_shared_default_agent(name: str, api_key: str, model: str = MODEL_NAME) -> "Agent":
+    """Default persona agent, built on first use and shared by every session with the same API key"""
+    return _build_agent(DEFAULT_PERSONAS[name], get_shared_llm(api_key, model))
+
+
+class _LazyAgents(Mapping):
+    """Read-only view over a persona store that materializes agents lazily
+
+    Default agents on the live Groq client are pooled process-wide; every
+    other agent is built on first access and kept by this view.
+    """
+
+    def __init__(self, personas: PersonaStore, registry: "AgentRegistry", pooled: bool = False):
+        self.personas = personas
+        self.registry = registry
+        self.pooled = pooled
+        self._built: Dict[str, "Agent"] = {}
+
+    def __getitem__(self, name: str) -> "Agent":
+        agent = self._built.get(name)
+        if agent is not None:
+            return agent
+        persona = self.personas[name]
+        if self.pooled and self.registry.llm is None:
+            return get_shared_default_agent(name, self.registry.api_key)
+        agent = self._built[name] = _build_agent(persona, self.registry._agent_llm())
+        return agent
+
+    def __contains__(self, name: object) -> bool:
+        # Membership checks must not materialize the agent
+        return name in self.personas
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.personas)
+
+    def __len__(self) -> int:
+        return len(self.personas)
+
+
 class AgentRegistry:
-    """Manages all available agents for YapYard"""
-    
-    def __init__(self):
-        self.agents = self._get_default_agents()
-        self.custom_agents = {}
-    
-    def _get_default_agents(self) -> Dict[str, Agent]:
-        """Returns predefined personality agents"""
-        llm = _get_llm()
-        return {
-            "The Critic": Agent(
-                name="The Critic",
-                role="Blunt, sarcastic commenter who finds flaws in everything",
-                goal="Point out all weaknesses, inconsistencies, and flaws with a biting, sarcastic tone. Be harsh but constructive.",
-                backstory="You're an experienced content critic who has seen it all. Nothing impresses you easily, and you have a sharp tongue for mediocrity.",
-                verbose=False,
-                llm=llm,
-                allow_delegation=False
-            ),
-            
-            "The Supportive Friend": Agent(
-                name="The Supportive Friend",
-                role="Warm, encouraging voice that celebrates effort",
-                goal="Motivate and celebrate the creator's effort. Find positive aspects and provide uplifting feedback.",
-                backstory="You're genuinely excited about people's creative endeavors. You see potential everywhere and love to encourage others.",
-                verbose=False,
-                llm=llm,
-                allow_delegation=False
-            ),
-            
-            "The Analyst": Agent(
-                name="The Analyst",
-                role="Technical, data-driven persona who breaks down content professionally",
-                goal="Provide detailed, analytical feedback focusing on structure, logic, and technical aspects.",
-                backstory="You approach content with a professional eye, looking for data, evidence, and logical structure. You're thorough and methodical.",
-                verbose=False,
-                llm=llm,
-                allow_delegation=False
-            ),
-            
-            "The Internet Troll": Agent(
-                name="The Internet Troll",
-                role="Disruptive, provocative commenter who mocks and provokes",
-                goal="Mock the content, provoke reactions, and be generally disruptive while staying within bounds.",
-                backstory="You live for chaos and reactions. You find weaknesses and exploit them for entertainment, but you're not genuinely malicious.",
-                verbose=False,
-                llm=llm,
-                allow_delegation=False
-            ),
-            
-            "The Superfan": Agent(
-                name="The Superfan",
-                role="Loyal hype machine who showers content with praise",
-                goal="Show extreme enthusiasm and excitement. Hype up every aspect of the content with genuine fanboy/fangirl energy.",
-                backstory="You're absolutely devoted and see genius in everything this creator does. Your enthusiasm knows no bounds.",
-                verbose=False,
-                llm=llm,
-                allow_delegation=False
-            ),
-            
-            "The Newcomer": Agent(
-                name="The Newcomer",
-                role="Curious newcomer asking genuine questions",
-                goal="Ask honest questions from the perspective of someone new to the topic or creator.",
-                backstory="You're new here and genuinely curious. You ask the questions others might be thinking but won't voice.",
-                verbose=False,
-                llm=llm,
-                allow_delegation=False
-            ),
-            
-            "The Expert": Agent(
-                name="The Expert",
-                role="Industry expert with deep knowledge",
-                goal="Provide expert-level insights and corrections based on deep domain knowledge.",
-                backstory="You have years of experience in this field and can spot nuances others miss. You share knowledge generously.",
-                verbose=False,
-                llm=llm,
-                allow_delegation=False
-            ),
-            
-            "The Nigerian": Agent(
-                name="The Nigerian",
-                role="Chaotic Naija roast master who speaks in pidgin and lives for social media trends",
-                goal="Mock everything like a true Naija savage. Use pidgin, make fun of poor effort, exaggerate flaws, and find a way to make it trend-worthy. Always dey find cruise.",
-                backstory=(
-                    "You be typical Naija internet troll with mad sense of humor. "
-                    "You no dey take anything serious. If person mess up, na you go carry am go viral. "
-                    "You sabi roast, yab, and turn even normal tins into comedy. You no dey hate, "
-                    "but you go finish pesin with laugh. Twitter and TikTok na your playground."
-                ),
-                verbose=False,
-                llm=llm,
-                allow_delegation=False
-            )
-
-        }
-    
-    def spawn_agent(self, name: str, tone: str, goal: str) -> Agent:
-        """Create a new custom agent"""
-        llm = _get_llm()
-        agent = Agent(
+    """Manages all available agents for YapYard
+
+    Default agents and LLM clients are pooled process-wide per API key; only
+    custom agents live on the (session-scoped) registry. Passing `llm` (see
+    llm_backends.create_llm) runs every agent on it and needs no API key or
+    Streamlit session.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, llm: Optional["LLM"] = None):
+        self.llm = llm
+        if api_key:
+            self.api_key = api_key.strip()
+        elif llm is not None:
+            self.api_key = None
+        else:
+            self.api_key = _get_session_api_key()
+        self.custom_personas = PersonaStore()
+        self.agents = _LazyAgents(DEFAULT_PERSONAS, self, pooled=True)
+        self.custom_agents = _LazyAgents(self.custom_personas, self)
+        # (name, model) -> custom agent rebuilt on a routed model
+        self._routed_custom_agents: Dict[Tuple[str, str], "Agent"] = {}
+        # One view for the registry's lifetime; custom agents shadow defaults
+        self._all_agents = ChainMap(self.custom_agents, self.agents)
+
+    def _agent_llm(self) -> "LLM":
+        return self.llm if self.llm is not None else get_shared_llm(self.api_key)
+
+    def llm_for(self, model: str) -> "LLM":
+        """Client for `model`; an offline registry runs every model on its own llm"""
+        return self.llm if self.llm is not None else get_shared_llm(self.api_key, model)
+
+    def get_agent_on_model(self, name: str, model: str) -> "Agent":
+        """The agent for `name` running on `model` instead of the default model"""
+        if self.llm is not None or model == MODEL_NAME:
+            return self.get_all_agents()[name]
+        if name not in self.custom_personas:
+            return get_shared_default_agent(name, self.api_key, model)
+        agent = self._routed_custom_agents.get((name, model))
+        if agent is None:
+            agent = self._routed_custom_agents[(name, model)] = _build_agent(self.custom_personas[name], self.llm_for(model))
+        return agent
+
+    def spawn_agent(self, name: str, tone: str, goal: str) -> Persona:
+        """Register a custom persona; its agent is built the first time it is used"""
+        persona = Persona(
             name=name,
             role=f"Custom commenter with a {tone} tone",
             goal=goal,
             backstory=f"You are a commenter with a {tone} personality. Your approach to content is guided by: {goal}",
-            verbose=False,
-            llm=llm,
-            allow_delegation=False
+            tags=("custom", tone.lower()),
         )
-        self.custom_agents[name] = agent
-        return agent
-    
-    def get_all_agents(self) -> Dict[str, Agent]:
-        """Get all available agents (default + custom)"""
-        all_agents = self.agents.copy()
-        all_agents.update(self.custom_agents)
-        return all_agents
-    
+        self.custom_personas.add(persona)
+        self.custom_agents._built.pop(name, None)
+        for key in [key for key in self._routed_custom_agents if key[0] == name]:
+            del self._routed_custom_agents[key]
+        return persona
+
+    def get_all_agents(self) -> Mapping[str, "Agent"]:
+        """Get all available agents (default + custom); custom agents shadow defaults"""
+        return self._all_agents
+
+    def get_persona(self, name: str) -> Optional[Persona]:
+        """Persona definition by name, without building its agent"""
+        return self.custom_personas.get(name) or DEFAULT_PERSONAS.get(name)
+
+    def names_with_tag(self, tag: str) -> List[str]:
+        """Names of default and custom personas carrying `tag`"""
+        custom = self.custom_personas.names_with_tag(tag)
+        return custom + [name for name in DEFAULT_PERSONAS.names_with_tag(tag) if name not in self.custom_personas]
+
+    def agent_fingerprint(self, name: str) -> str:
+        """Hash of everything that defines an agent's behaviour (persona and model)"""
+        agent = self.get_all_agents()[name]
+        model = getattr(getattr(agent, "llm", None), "model", "") or ""
+        return content_hash(agent.name or name, agent.role, agent.goal, agent.backstory, str(model))
+
     def get_agent_names(self) -> List[str]:
         """Get list of all agent names"""
-        return list(self.get_all_agents().keys())
\ No newline at end of file
+        return list(self.get_all_agents().keys())
@@ -1,41 +1,25 @@
-# >>> MUST BE THE FIRST LINES IN app.py (no imports above these)
-import os, sys
-
-# Option A: prefer switching chroma to DuckDB (avoid sqlite entirely)
-# Set this BEFORE chromadb/crewai import (also save it as a Streamlit env var)
-os.environ.setdefault("CHROMA_DB_IMPL", "duckdb+parquet")
-# optional: change crewai storage dir
-os.environ.setdefault("CREWAI_STORAGE_DIR", "./.crewai_storage")
-
-# Option B: fallback — force Python to use bundled modern sqlite
-# (keeps code using sqlite but gives a modern sqlite implementation)
-try:
-    import pysqlite3 as pysqlite3_mod  # installed from pysqlite3-binary
-    sys.modules['sqlite3'] = pysqlite3_mod
-except Exception as e:
-    # if this fails, keep going so we can see the original error in logs
-    print("pysqlite3 import/override failed:", e)
-
-# Now it is safe to import the rest of your app
-# from agents import AgentRegistry   # <-- OK now
-# from crewai import Task, Crew
-# import streamlit as st
+import os
+import threading
 
+# on-disk caches (summaries survive Streamlit restarts)
+os.environ.setdefault("YAPYARD_CACHE_DIR", "./.yapyard_cache")
+# comment engine backend: "crew" (CrewAI orchestration) or "direct" (single litellm call)
+os.environ.setdefault("YAPYARD_ENGINE", "crew")
 
+# CrewAI (and the Chroma/sqlite shim it may need) is imported lazily by
+# runtime.load_crewai() when the first agent is built, not at startup.
 import streamlit as st
-import os
 from agents import AgentRegistry
-from comment_engine import CommentEngine
+from comment_engine import create_comment_engine
+from cache import ResultCache, SummaryCache
+from metrics import PROCESS_METRICS
 from new_agent import show_agent_creator
-from utils import format_content_preview, calculate_heat_rating, get_toxicity_level
+from prewarm import Prewarmer
+from utils import format_content_preview, get_toxicity_level, HeatAccumulator
 import time
 
-# import chromadb
-
-# # Force Chroma to use DuckDB instead of SQLite
-# import chromadb
-
-# client = chromadb.Client() 
+# Comment threads rendered per feed page
+COMMENTS_PER_PAGE = 10
 
 
 # Configure page
@@ -89,6 +73,147 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource(show_spinner=False)
+def get_summary_cache():
+    """Summary cache shared by every session in the process"""
+    return SummaryCache(path=os.path.join(os.environ["YAPYARD_CACHE_DIR"], "summaries.sqlite"))
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    """Comment result cache shared by every session in the process"""
+    return ResultCache(path=os.path.join(os.environ["YAPYARD_CACHE_DIR"], "results.sqlite"))
+
+def render_comment(container, comment):
+    """Render a single top-level comment card"""
+    container.markdown(f"""
+    <div class="comment-box">
+        <div class="comment-author">{comment['author']}</div>
+        <div class="comment-text">{comment['text']}</div>
+        <div class="comment-timestamp">{comment['timestamp']}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+def render_heat_and_stats(container, heat):
+    """Render the heat rating and stats panel from a HeatAccumulator"""
+    container.header("🔥 Heat Rating")
+    heat_rating = heat.rating
+    toxicity_level = get_toxicity_level(heat_rating)
+    
+    container.markdown(f"""
+    <div class="heat-rating">
+        {heat_rating}/10<br>
+        {toxicity_level}
+    </div>
+    """, unsafe_allow_html=True)
+    
+    container.header("📈 Stats")
+    container.metric("Total Comments", heat.count)
+    container.metric("Avg Comment Length", f"{heat.average_length} chars")
+
+def render_usage_metrics(container, collector, key):
+    """Render LLM usage (latency, tokens, cache hits, failures) with JSON/Prometheus exports"""
+    usage = collector.summary()
+    col_a, col_b = container.columns(2)
+    col_a.metric("LLM Calls", usage["calls"])
+    col_b.metric("Cache Hits", usage["cache_hits"])
+    col_a.metric("p50 Latency", f"{usage['wall_ms_p50'] / 1000:.2f} s")
+    col_b.metric("p95 Latency", f"{usage['wall_ms_p95'] / 1000:.2f} s")
+    col_a.metric("Prompt Tokens", usage["prompt_tokens"])
+    col_b.metric("Completion Tokens", usage["completion_tokens"])
+    container.caption(f"Prompt tokens saved by content budgeting: {usage['tokens_saved']}")
+    if usage["failures"]:
+        container.warning("Failures: " + ", ".join(f"{name} × {count}" for name, count in usage["failures"].items()))
+    container.download_button("Export JSON", collector.to_json(), file_name="yapyard_metrics.json",
+                              mime="application/json", key=f"{key}_json", on_click="ignore")
+    container.download_button("Export Prometheus", collector.to_prometheus(), file_name="yapyard_metrics.prom",
+                              mime="text/plain", key=f"{key}_prom", on_click="ignore")
+
+def render_reply(container, author, text, timestamp):
+    """Render an indented reply card under a comment"""
+    container.markdown(f"""
+    <div class="comment-box" style="margin-left: 20px; border-left: 4px solid #6c757d;">
+        <div class="comment-author">{author}</div>
+        <div class="comment-text">{text}</div>
+        <div class="comment-timestamp">{timestamp}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+@st.fragment
+def render_comment_thread(i):
+    """One comment with its reply box and replies; sending a reply reruns only this thread"""
+    comment = st.session_state.generated_comments[i]
+    render_comment(st, comment)
+
+    # Reply section; the form only submits on "Send Reply", so typing causes no rerun at all
+    with st.expander(f"Reply to {comment['author']}"):
+        with st.form(key=f"reply_form_{i}", clear_on_submit=True, border=False):
+            user_reply_text = st.text_area(
+                "Your reply:",
+                key=f"user_reply_{i}",
+                placeholder="Type your reply here..."
+            )
+            send_reply = st.form_submit_button("Send Reply")
+
+        if send_reply and user_reply_text.strip():
+            with st.spinner("Generating agent's reply..."):
+                try:
+                    # Assuming the agent who made the original comment will reply
+                    agent_to_reply = comment['author']
+
+                    thread = comment.setdefault('replies', [])
+                    reply = st.session_state.comment_engine.generate_reply(
+                        st.session_state.current_content,
+                        comment['author'],
+                        comment['text'],
+                        user_reply_text,
+                        agent_to_reply,
+                        thread=thread,
+                        cancel=st.session_state.generation_cancel
+                    )
+                    # The thread alternates your replies and the agent's
+                    thread.append({'author': "You", 'text': user_reply_text, 'timestamp': "Just now", 'from_user': True})
+                    thread.append(reply)
+                    st.success("Reply generated!")
+                except Exception as e:
+                    st.error(f"Error generating reply: {str(e)}")
+
+    # Display the thread, oldest first
+    for reply in comment.get('replies', []):
+        label = "You (Your Reply)" if reply.get('from_user') else f"{reply['author']} (Reply)"
+        render_reply(st, label, reply['text'], reply['timestamp'])
+
+@st.fragment
+def render_comment_feed():
+    """Paginated comment feed; changing page reruns only the feed"""
+    comments = st.session_state.generated_comments
+    pages = max(1, -(-len(comments) // COMMENTS_PER_PAGE))
+    page = min(st.session_state.get('feed_page', 0), pages - 1)
+
+    st.header("💬 Simulated Comments")
+    for i in range(page * COMMENTS_PER_PAGE, min(len(comments), (page + 1) * COMMENTS_PER_PAGE)):
+        render_comment_thread(i)
+
+    if pages > 1:
+        prev_col, info_col, next_col = st.columns([1, 2, 1])
+        if prev_col.button("← Previous", key="feed_prev", disabled=page == 0):
+            st.session_state.feed_page = page - 1
+            st.rerun(scope="fragment")
+        info_col.caption(f"Page {page + 1} of {pages} · {len(comments)} comments")
+        if next_col.button("Next →", key="feed_next", disabled=page == pages - 1):
+            st.session_state.feed_page = page + 1
+            st.rerun(scope="fragment")
+
+@st.fragment
+def render_stats_panel():
+    """Heat rating and usage panel; its export buttons rerun only this panel"""
+    if st.session_state.generated_comments:
+        render_heat_and_stats(st, st.session_state.comment_heat)
+
+    st.subheader("⚙️ LLM Usage (this session)")
+    render_usage_metrics(st, st.session_state.comment_engine.metrics, key="session_metrics")
+    with st.expander("All sessions"):
+        render_usage_metrics(st, PROCESS_METRICS, key="process_metrics")
+
 def main():
     if 'authenticated' not in st.session_state or not st.session_state.authenticated:
         st.switch_page("pages/login.py")
@@ -99,12 +224,26 @@ def main():
         st.session_state.agent_registry = AgentRegistry()
     
     if 'comment_engine' not in st.session_state:
-        st.session_state.comment_engine = CommentEngine(st.session_state.agent_registry)
+        st.session_state.comment_engine = create_comment_engine(
+            st.session_state.agent_registry,
+            backend=os.environ["YAPYARD_ENGINE"],
+            summary_cache=get_summary_cache(),
+            result_cache=get_result_cache()
+        )
+    
+    if 'prewarmer' not in st.session_state:
+        st.session_state.prewarmer = Prewarmer(st.session_state.comment_engine)
     
     if 'generated_comments' not in st.session_state:
         st.session_state.generated_comments = []
+    if 'comment_heat' not in st.session_state:
+        # Kept in step with generated_comments so reruns don't rescan every comment
+        st.session_state.comment_heat = HeatAccumulator()
     if 'current_content' not in st.session_state:
         st.session_state.current_content = ""
+    if 'generation_cancel' not in st.session_state:
+        # Set by "Clear All Comments" to stop the generation that is still running
+        st.session_state.generation_cancel = threading.Event()
     
     # Header
     st.title("🗣️ YapYard")
@@ -144,6 +283,41 @@ def main():
             help="How many comments to generate"
         )
         
+        # Concurrency limit
+        max_concurrency = st.slider(
+            "Parallel Requests",
+            min_value=1,
+            max_value=8,
+            value=4,
+            help="How many comments are generated at the same time"
+        )
+        
+        batched = st.toggle(
+            "Batch per Personality",
+            value=False,
+            help="Ask each personality for all of its comments in one request (fewer tokens, fewer calls)"
+        )
+        
+        reuse_cached = st.toggle(
+            "Reuse Cached Comments",
+            value=False,
+            help="Serve comments already generated for this exact content and personalities instead of calling the model again. Only runs with this on are cached."
+        )
+        
+        time_budget = st.slider(
+            "Time Budget (s)",
+            min_value=10,
+            max_value=120,
+            value=60,
+            help="Show whatever is ready after this long; slower comments are marked as still generating"
+        )
+        
+        speculative = st.toggle(
+            "Pre-warm While Editing",
+            value=False,
+            help="Summarize your content and draft the first comments in the background once it stops changing (uses tokens even if you never click Generate)"
+        )
+        
         st.divider()
         
         # Custom agent creator
@@ -156,8 +330,8 @@ def main():
 
         # Display custom agents
         st.subheader("Your Custom Agents")
-        if st.session_state.agent_registry.custom_agents:
-            for agent_name, agent_obj in st.session_state.agent_registry.custom_agents.items():
+        if st.session_state.agent_registry.custom_personas:
+            for agent_name in st.session_state.agent_registry.custom_personas:
                 st.write(f"- {agent_name}")
         else:
             st.info("No custom agents spawned yet.")
@@ -166,7 +340,12 @@ def main():
 
         # Clear all comments button
         if st.button("Clear All Comments", help="Removes all generated comments from display."):
+            st.session_state.prewarmer.cancel()
+            st.session_state.generation_cancel.set()
+            st.session_state.generation_cancel = threading.Event()
             st.session_state.generated_comments = []
+            st.session_state.comment_heat = HeatAccumulator()
+            st.session_state.feed_page = 0
             st.session_state.current_content = ""
             st.rerun()
     
@@ -186,112 +365,70 @@ def main():
         )
         content = st.session_state.current_content
         
+        # Keyed to this exact request; any change cancels the previous speculation
+        if speculative and content and selected_agents:
+            st.session_state.prewarmer.schedule(content, selected_agents, num_comments,
+                                                batched=batched, fresh=not reuse_cached)
+        else:
+            st.session_state.prewarmer.cancel()
+        
         # Generate button
         if st.button("🚀 Generate Comments", type="primary", disabled=not st.session_state.current_content or not selected_agents):
             if st.session_state.current_content and selected_agents:
+                # Placeholders for the live feed and live stats while comments stream in
+                feed_placeholder = st.empty()
+                with col2:
+                    live_stats_placeholder = st.empty()
+                
                 with st.spinner("Generating comments... This may take a moment."):
                     try:
-                        comments = st.session_state.comment_engine.generate_comments(
-                            st.session_state.current_content, selected_agents, num_comments
+                        feed = feed_placeholder.container()
+                        feed.header("💬 Simulated Comments")
+                        finished = {}
+                        heat = HeatAccumulator()
+                        cancel = st.session_state.generation_cancel
+                        warm = st.session_state.prewarmer.take(
+                            st.session_state.current_content, selected_agents, num_comments,
+                            batched=batched, fresh=not reuse_cached
                         )
+                        for slot, comment in st.session_state.comment_engine.iter_comments(
+                            st.session_state.current_content, selected_agents, num_comments,
+                            max_concurrency=max_concurrency, batched=batched,
+                            fresh=not reuse_cached, warm=warm,
+                            deadline=time_budget, cancel=cancel
+                        ):
+                            finished[slot] = comment
+                            if not comment.get('pending'):
+                                heat.add(comment)
+                            render_comment(feed, comment)
+                            render_heat_and_stats(live_stats_placeholder.container(), heat)
+                        
+                        comments = [finished[slot] for slot in sorted(finished)]
                         st.session_state.generated_comments = comments
-                        st.success(f"Generated {len(comments)} comments!")
+                        st.session_state.comment_heat = heat
+                        st.session_state.feed_page = 0
+                        pending = sum(1 for comment in comments if comment.get('pending'))
+                        if pending:
+                            st.warning(f"{pending} of {len(comments)} comments did not finish within {time_budget}s.")
+                        else:
+                            st.success(f"Generated {len(comments)} comments!")
                     except Exception as e:
                         st.error(f"Error generating comments: {str(e)}")
+                    finally:
+                        # The full feed and stats are rendered below from session state
+                        feed_placeholder.empty()
+                        live_stats_placeholder.empty()
         
         # Display comments
         if st.session_state.generated_comments:
-            st.header("💬 Simulated Comments")
-            
-            for i, comment in enumerate(st.session_state.generated_comments):
-                st.markdown(f"""
-                <div class="comment-box">
-                    <div class="comment-author">{comment['author']}</div>
-                    <div class="comment-text">{comment['text']}</div>
-                    <div class="comment-timestamp">{comment['timestamp']}</div>
-                </div>
-                """, unsafe_allow_html=True)
-
-                # Reply section
-                with st.expander(f"Reply to {comment['author']}"):
-                    user_reply_key = f"user_reply_{i}"
-                    reply_button_key = f"reply_button_{i}"
-
-                    user_reply_text = st.text_area(
-                        "Your reply:",
-                        key=user_reply_key,
-                        placeholder="Type your reply here..."
-                    )
-                    if user_reply_text:
-                        st.session_state.generated_comments[i]['user_reply'] = user_reply_text
-
-                    if st.button("Send Reply", key=reply_button_key, disabled=not user_reply_text):
-                        with st.spinner("Generating agent's reply..."):
-                            try:
-                                # Assuming the agent who made the original comment will reply
-                                agent_to_reply = comment['author']
-                                
-                                reply = st.session_state.comment_engine.generate_reply(
-                                    st.session_state.current_content, 
-                                    comment['author'], 
-                                    comment['text'], 
-                                    user_reply_text, 
-                                    agent_to_reply
-                                )
-                                if 'replies' not in comment:
-                                    comment['replies'] = []
-                                comment['replies'].append(reply)
-                                st.success("Reply generated!")
-                                # Store the user's reply in the comment object
-                                st.session_state.generated_comments[i]['user_reply'] = user_reply_text
-                                # Clear the text area after sending
-                                st.session_state[user_reply_key] = ""
-                            except Exception as e:
-                                st.error(f"Error generating reply: {str(e)}")
-                        st.rerun()
-
-                # Display replies if any
-                if 'replies' in comment and comment['replies']:
-                    # Display user's reply if it exists
-                    if 'user_reply' in comment and comment['user_reply']:
-                        st.markdown(f"""
-                        <div class="comment-box" style="margin-left: 20px; border-left: 4px solid #6c757d;">
-                            <div class="comment-author">You (Your Reply)</div>
-                            <div class="comment-text">{comment['user_reply']}</div>
-                            <div class="comment-timestamp">Just now</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                    for reply in comment['replies']:
-                        st.markdown(f"""
-                        <div class="comment-box" style="margin-left: 20px; border-left: 4px solid #6c757d;">
-                            <div class="comment-author">{reply['author']} (Reply)</div>
-                            <div class="comment-text">{reply['text']}</div>
-                            <div class="comment-timestamp">{reply['timestamp']}</div>
-                        </div>
-                        """, unsafe_allow_html=True)
+            render_comment_feed()
     
     with col2:
         if st.session_state.current_content:
             st.header("📊 Content Preview")
             st.info(format_content_preview(st.session_state.current_content, 200))
             
-            if st.session_state.generated_comments:
-                st.header("🔥 Heat Rating")
-                heat_rating = calculate_heat_rating(st.session_state.generated_comments)
-                toxicity_level = get_toxicity_level(heat_rating)
-                
-                st.markdown(f"""
-                <div class="heat-rating">
-                    {heat_rating}/10<br>
-                    {toxicity_level}
-                </div>
-                """, unsafe_allow_html=True)
-                
-                st.header("📈 Stats")
-                st.metric("Total Comments", len(st.session_state.generated_comments))
-                st.metric("Avg Comment Length", 
-                         f"{sum(len(c['text']) for c in st.session_state.generated_comments) // len(st.session_state.generated_comments)} chars")
+            render_stats_panel()
     
     # Footer
     st.divider()
@@ -0,0 +1,72 @@
+"""Compare per-comment overhead of the Crew and direct engine backends.
+
+Every model call is answered locally by litellm's ``mock_response`` after a
+fixed simulated latency, so the difference between wall time and that latency
+is the orchestration overhead each backend adds per comment.
+
+    python benchmarks/engine_overhead.py [--comments 20] [--latency-ms 0]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import AgentRegistry, DEFAULT_PERSONAS
+from comment_engine import ENGINE_BACKENDS
+from runtime import load_crewai, load_litellm
+
+MOCK_COMMENT = "Honestly this is better than I expected, but the ending drags."
+BENCHMARK_API_KEY = "gsk_" + "0" * 52
+
+
+def patch_completion(latency_s: float) -> None:
+    """Answer every litellm completion locally after `latency_s` seconds"""
+    litellm = load_litellm()
+    real_completion = litellm.completion
+
+    def mocked_completion(*args, **kwargs):
+        time.sleep(latency_s)
+        kwargs["mock_response"] = MOCK_COMMENT
+        return real_completion(*args, **kwargs)
+
+    litellm.completion = mocked_completion
+
+
+def run_backend(backend: str, num_comments: int, latency_s: float) -> list:
+    """Per-comment overhead in milliseconds for one backend, generated sequentially"""
+    # The fake key must not go through the process-wide rate limiter, and hedges would double calls
+    engine = ENGINE_BACKENDS[backend](AgentRegistry(api_key=BENCHMARK_API_KEY), max_concurrency=1,
+                                      rate_limited=False, hedge=False)
+    personas = list(DEFAULT_PERSONAS)
+    overheads = []
+    for i in range(num_comments):
+        started = time.perf_counter()
+        engine.generate_comments("Just dropped my first video essay!", [personas[i % len(personas)]], 1)
+        overheads.append((time.perf_counter() - started - latency_s) * 1000)
+    return overheads
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--comments", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    load_crewai()
+    patch_completion(args.latency_ms / 1000)
+
+    print(f"{'backend':<8} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+    for backend in ENGINE_BACKENDS:
+        # Warm-up call so one-off imports and agent construction are not counted
+        run_backend(backend, 1, args.latency_ms / 1000)
+        overheads = sorted(run_backend(backend, args.comments, args.latency_ms / 1000))
+        p95 = overheads[min(len(overheads) - 1, int(len(overheads) * 0.95))]
+        print(f"{backend:<8} {statistics.median(overheads):9.2f} {p95:9.2f} {statistics.mean(overheads):9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Benchmark the heat-rating scanner against the original substring loop.
+
+    python benchmarks/heat_rating.py [--comments 50000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import DEFAULT_HEAT_SCANNER, HeatAccumulator, calculate_heat_rating
+
+SAMPLE_TEXTS = [
+    "Wow, this is amazing!!! I love it.",
+    "Honestly terrible pacing, and the glove scene made no sense.",
+    "omg wtf did I just watch",
+    "Solid structure, though the second point lacks evidence and the conclusion drags on a bit longer than it needs to.",
+    "Interesting take.",
+    "I hate how much I love this!",
+]
+
+
+def legacy_heat_rating(comments: List[Dict]) -> int:
+    """The original implementation, kept as the baseline"""
+    if not comments:
+        return 0
+    total_heat = 0
+    for comment in comments:
+        text = comment['text'].lower()
+        heat = 1
+        if len(text) > 100:
+            heat += 1
+        emotional_words = ['amazing', 'terrible', 'love', 'hate', 'wow', 'omg', 'wtf', '!', '!!!']
+        for word in emotional_words:
+            if word in text:
+                heat += 1
+        total_heat += min(heat, 5)
+    avg_heat = total_heat / len(comments)
+    return min(int(avg_heat * 2), 10)
+
+
+def timed(fn, *args, repeat: int = 5) -> float:
+    """Best of `repeat` runs in ms, so scheduler noise does not decide the comparison"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--comments", type=int, default=50000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    comments = [{"text": rng.choice(SAMPLE_TEXTS)} for _ in range(args.comments)]
+    texts = [c["text"] for c in comments]
+
+    print(f"{args.comments} comments")
+    print(f"legacy substring loop      {timed(legacy_heat_rating, comments):9.1f} ms")
+    print(f"calculate_heat_rating      {timed(calculate_heat_rating, comments):9.1f} ms")
+    print(f"HeatScanner.rate_texts     {timed(DEFAULT_HEAT_SCANNER.rate_texts, texts):9.1f} ms")
+
+    accumulator = HeatAccumulator()
+    accumulator.extend(comments[:-1])
+    per_comment_us = timed(accumulator.add, comments[-1], repeat=1) * 1000
+    print(f"HeatAccumulator.add (1)    {per_comment_us:9.1f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
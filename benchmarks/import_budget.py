@@ -0,0 +1,99 @@
+"""Check that YapYard's own startup imports stay cheap.
+
+Runs a fresh interpreter with ``-X importtime``, pre-imports the third-party
+UI stack (Streamlit, dotenv) so it is not charged to us, then imports the
+modules ``app.py`` needs before the first render. Fails (exit code 1) if their
+cumulative import time exceeds the budget or if any heavy LLM module is pulled
+in at startup.
+
+    python benchmarks/import_budget.py [--budget-ms 150]
+
+tests/test_import_budget.py runs the same check at the default budget.
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def startup_modules() -> list:
+    """YapYard's own modules imported at the top of app.py, read from its source so the list cannot drift"""
+    with open(os.path.join(REPO_ROOT, "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names.extend(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module.split(".")[0])
+    local = [name for name in dict.fromkeys(names) if os.path.isfile(os.path.join(REPO_ROOT, f"{name}.py"))]
+    # runtime holds the lazy loaders every startup module goes through
+    if "runtime" not in local:
+        local.append("runtime")
+    return local
+
+
+STARTUP_MODULES = startup_modules()
+
+# Must only load when the first generation runs
+HEAVY_MODULES = ["crewai", "chromadb", "litellm", "pysqlite3", "groq"]
+
+DEFAULT_BUDGET_MS = 150.0
+
+
+def measure_import_time() -> tuple:
+    """Return ({top-level module: cumulative µs}, set of every imported module)"""
+    code = (
+        "import streamlit, dotenv\n"
+        f"import {', '.join(STARTUP_MODULES)}\n"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+
+    cumulative = {}
+    imported = set()
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, raw_name = line[len("import time:"):].split("|")
+        module = raw_name.strip()
+        imported.add(module.split(".")[0])
+        # Only count modules imported directly by the snippet; nested ones are in their parent's total
+        is_top_level = len(raw_name) - len(raw_name.lstrip()) == 1
+        if is_top_level and module in STARTUP_MODULES:
+            cumulative[module] = int(cumulative_us)
+    return cumulative, imported
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    args = parser.parse_args()
+
+    cumulative, imported = measure_import_time()
+    total_ms = sum(cumulative.values()) / 1000
+    for module, micros in sorted(cumulative.items(), key=lambda item: -item[1]):
+        print(f"{module:<16} {micros / 1000:8.1f} ms")
+    print(f"{'total':<16} {total_ms:8.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    leaked = sorted(set(HEAVY_MODULES) & imported)
+    if leaked:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(leaked)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("FAIL: startup import budget exceeded")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
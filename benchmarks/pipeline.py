@@ -0,0 +1,212 @@
+"""Benchmark the comment generation pipeline against a local stub model.
+
+Every model call is served by the synthetic LLM backend (no network, no API
+key) with a configurable simulated latency, so runs are repeatable and only
+measure YapYard's own pipeline.
+
+    python benchmarks/pipeline.py run --latency-ms 50 --output bench.json
+    python benchmarks/pipeline.py compare base.json bench.json --threshold 0.10
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import AgentRegistry, DEFAULT_PERSONAS
+from comment_engine import ENGINE_BACKENDS
+from llm_backends import create_llm
+from utils import calculate_heat_rating
+
+NUM_COMMENTS_SWEEP = [1, 5, 10, 20, 40]
+PERSONA_SWEEP = [1, 2, 4, 8]
+# Around the 800-char summarization threshold, plus long-form content
+CONTENT_LENGTH_SWEEP = [400, 790, 810, 1600, 5000]
+
+SAMPLE_SENTENCE = "I finally published the video essay I've been scripting for three months. "
+SAMPLE_COMMENT = {"author": "The Critic", "text": "Wow, amazing effort!!! I love the pacing but hate the ending.", "timestamp": "1m ago"}
+
+# Metrics where a higher value in the new run is a regression
+LOWER_IS_BETTER = ["p50_ms", "p95_ms", "calls_per_comment", "prompt_tokens_per_comment"]
+
+
+def make_content(length: int) -> str:
+    return (SAMPLE_SENTENCE * (length // len(SAMPLE_SENTENCE) + 1))[:length]
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(fn: Callable[[], int], repeats: int, llm) -> Dict[str, float]:
+    """Time `fn` (which returns how many items it produced) and collect model usage"""
+    llm.reset_usage()
+    durations = []
+    items = 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        items += fn()
+        durations.append(time.perf_counter() - started)
+    usage = llm.usage()
+    items = max(items, 1)
+    return {
+        "p50_ms": statistics.median(durations) * 1000,
+        "p95_ms": percentile(durations, 0.95) * 1000,
+        "throughput_per_s": items / sum(durations) if sum(durations) else 0.0,
+        "calls_per_comment": usage["calls"] / items,
+        "prompt_tokens_per_comment": usage["prompt_tokens"] / items,
+        "completion_tokens_per_comment": usage["completion_tokens"] / items,
+    }
+
+
+def run_suite(args) -> Dict:
+    llm = create_llm("synthetic", latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    personas = list(DEFAULT_PERSONAS)
+    results: Dict[str, Dict[str, float]] = {}
+
+    def new_engine():
+        # Fresh engine per case so summary caching does not leak between cases
+        return ENGINE_BACKENDS[args.backend](AgentRegistry(llm=llm), max_concurrency=args.concurrency)
+
+    short_content = make_content(400)
+    for num_comments in NUM_COMMENTS_SWEEP:
+        engine = new_engine()
+        results[f"generate_comments/n={num_comments}"] = measure(
+            lambda: len(engine.generate_comments(short_content, personas[:4], num_comments, batched=args.batched)),
+            args.repeats, llm
+        )
+
+    for num_personas in PERSONA_SWEEP:
+        engine = new_engine()
+        results[f"generate_comments/personas={num_personas}"] = measure(
+            lambda: len(engine.generate_comments(short_content, personas[:num_personas], 10, batched=args.batched)),
+            args.repeats, llm
+        )
+
+    for length in CONTENT_LENGTH_SWEEP:
+        content = make_content(length)
+        engine = new_engine()
+        results[f"generate_comments/content_chars={length}"] = measure(
+            lambda: len(engine.generate_comments(content, personas[:4], 5, batched=args.batched)),
+            args.repeats, llm
+        )
+        # Uncached on every repeat: each repeat gets its own engine
+        results[f"prepare_content/content_chars={length}"] = measure(
+            lambda: len([new_engine()._prepare_content(content)]),
+            args.repeats, llm
+        )
+
+    engine = new_engine()
+    results["generate_reply"] = measure(
+        lambda: len([engine.generate_reply(short_content, "The Critic", SAMPLE_COMMENT["text"], "Fair point!", "The Critic")]),
+        args.repeats, llm
+    )
+
+    # Prompt size and calls per reply should stay flat as the thread grows
+    for turns in (0, 8, 32):
+        thread = [{"author": "You", "text": "Fair point, but no.", "timestamp": "Just now", "from_user": True}
+                  if t % 2 == 0 else {"author": "The Critic", "text": SAMPLE_COMMENT["text"], "timestamp": "1s ago"}
+                  for t in range(turns)]
+        engine = new_engine()
+        results[f"generate_reply/thread_turns={turns}"] = measure(
+            lambda: len([engine.generate_reply(short_content, "The Critic", SAMPLE_COMMENT["text"], "Still wrong.",
+                                               "The Critic", thread=thread)]),
+            args.repeats, llm
+        )
+
+    raw_comment = '"' + SAMPLE_COMMENT["text"] * 8 + '"'
+    results["clean_comment/x1000"] = measure(
+        lambda: len([engine._clean_comment(raw_comment) for _ in range(1000)]),
+        args.repeats, llm
+    )
+    for count in (20, 1000, 20000):
+        comments = [SAMPLE_COMMENT] * count
+
+        def rate_comments() -> int:
+            calculate_heat_rating(comments)
+            return len(comments)
+
+        results[f"heat_rating/comments={count}"] = measure(rate_comments, args.repeats, llm)
+
+    return {
+        "meta": {
+            "backend": args.backend,
+            "batched": args.batched,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "repeats": args.repeats,
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(base: Dict, new: Dict, threshold: float) -> List[str]:
+    """Return a line per metric that got worse by more than `threshold` (relative)"""
+    regressions = []
+    for case, new_metrics in new["results"].items():
+        base_metrics = base["results"].get(case)
+        if base_metrics is None:
+            continue
+        for metric in LOWER_IS_BETTER:
+            before, after = base_metrics.get(metric, 0.0), new_metrics.get(metric, 0.0)
+            if before > 0 and (after - before) / before > threshold:
+                regressions.append(f"{case} {metric}: {before:.3f} -> {after:.3f} (+{(after - before) / before:.0%})")
+        before, after = base_metrics.get("throughput_per_s", 0.0), new_metrics.get("throughput_per_s", 0.0)
+        if before > 0 and (before - after) / before > threshold:
+            regressions.append(f"{case} throughput_per_s: {before:.3f} -> {after:.3f} (-{(before - after) / before:.0%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the suite and write results as JSON")
+    run.add_argument("--backend", choices=sorted(ENGINE_BACKENDS), default="crew")
+    run.add_argument("--latency-ms", type=float, default=50.0)
+    run.add_argument("--jitter-ms", type=float, default=0.0)
+    run.add_argument("--concurrency", type=int, default=4)
+    run.add_argument("--batched", action="store_true")
+    run.add_argument("--repeats", type=int, default=5)
+    run.add_argument("--output", default="bench_output.json")
+
+    cmp = commands.add_parser("compare", help="Flag regressions between two result files")
+    cmp.add_argument("base")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=0.10, help="Relative change that counts as a regression")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run_suite(args)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        for case, metrics in report["results"].items():
+            print(f"{case:<40} p50 {metrics['p50_ms']:9.2f} ms  p95 {metrics['p95_ms']:9.2f} ms  "
+                  f"calls/comment {metrics['calls_per_comment']:.2f}")
+        print(f"Wrote {args.output}")
+        return 0
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    regressions = compare(base, new, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print("No regressions.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Compare prompt sizes of the compacted templates with the original indented ones.
+
+    python benchmarks/prompt_tokens.py [--content-chars 600]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comment_engine import BATCH_PROMPT, COMMENT_PROMPT, DIVERSITY_HINT, REPLY_PROMPT
+from prompt_budget import PromptBudget, count_tokens
+from runtime import load_tokenizer
+
+SAMPLE_SENTENCE = "Just shipped the first version of my side project after six months of weekends. "
+SAMPLE_COMMENT = "Six months of weekends? Respect, but the landing page needs work."
+SAMPLE_TURNS = ["User: Thanks! What would you change first?", "The Critic: The hero copy, it says nothing.",
+                "User: Fair, any examples you like?"]
+
+
+def legacy_comment(content: str, avoid: str = "") -> str:
+    """The original comment prompt, kept as the baseline"""
+    diversity_hint = ""
+    if avoid:
+        diversity_hint = f"""
+                Someone already posted: "{avoid}"
+                Make a clearly different point in different words; do not repeat or paraphrase it.
+                """
+    return f"""
+                You are commenting on this content: "{content}"
+                {diversity_hint}
+                Write a short realistic social media comment that reflects your personality and goals.
+                The comment should be:
+                - Authentic to your character
+                - 1-3 sentences long
+                - Written in casual social media style
+                - Engaging and realistic
+
+                Do not include any meta-commentary or explanations, just write the comment as if you're responding directly to the content.
+                """
+
+
+def legacy_batch(content: str, count: int) -> str:
+    return f"""
+                You are commenting on this content: "{content}"
+
+                Write {count} different short realistic social media comments that reflect your personality and goals.
+                Each comment should be:
+                - Authentic to your character
+                - 1-3 sentences long
+                - Written in casual social media style
+                - Engaging, realistic and different from the other comments
+
+                Respond with ONLY a JSON array of exactly {count} strings, one comment per string, e.g. ["first comment", "second comment"].
+                Do not include any meta-commentary, numbering or explanations.
+                """
+
+
+def legacy_reply(content: str, turns) -> str:
+    recent_lines = "\n".join(f"            {turn}" for turn in turns)
+    return f"""
+                You are participating in a social media discussion.
+                Original content: "{content}"
+                Original comment from The Critic: "{SAMPLE_COMMENT}"
+                Most recent replies in the thread, oldest first:
+{recent_lines}
+
+                Your task is to generate a realistic social media reply from your persona (The Critic) to the user's latest reply.
+                The reply should be:
+                - Authentic to your character and consistent with what you said earlier in the thread.
+                - 1-2 sentences long.
+                - Written in casual social media style.
+                - Engaging and realistic.
+                - Directly address the user's latest reply.
+
+                Do not include any meta-commentary or explanations, just write the reply as if you're responding directly to the user.
+                """
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--content-chars", type=int, default=600)
+    args = parser.parse_args()
+
+    content = (SAMPLE_SENTENCE * (args.content_chars // len(SAMPLE_SENTENCE) + 1))[:args.content_chars]
+    reply_content = content[:400]
+    cases = [
+        ("comment", legacy_comment(content),
+         COMMENT_PROMPT.format(content=content, diversity_hint="")),
+        ("regenerate", legacy_comment(content, SAMPLE_COMMENT),
+         COMMENT_PROMPT.format(content=content, diversity_hint=DIVERSITY_HINT.format(avoid=SAMPLE_COMMENT))),
+        ("batch/3", legacy_batch(content, 3), BATCH_PROMPT.format(content=content, count=3)),
+        ("reply", legacy_reply(reply_content, SAMPLE_TURNS),
+         REPLY_PROMPT.format(content=reply_content, comment_author="The Critic", comment_text=SAMPLE_COMMENT,
+                             earlier="", recent="\n".join(SAMPLE_TURNS), persona="The Critic")),
+    ]
+
+    print(f"tokenizer: {'tiktoken cl100k_base' if load_tokenizer() is not None else 'estimate'}")
+    print(f"{'prompt':<12}{'legacy':>8}{'compact':>9}{'saved':>8}")
+    for name, legacy, compact in cases:
+        before, after = count_tokens(legacy), count_tokens(compact)
+        print(f"{name:<12}{before:>8}{after:>9}{(before - after) / before:>8.1%}")
+
+    budget = PromptBudget()
+    print(f"\ncontent budget: {budget.content_tokens} tokens on {budget.model}")
+    for chars in (400, 800, 900, 2000, 20000):
+        sample = (SAMPLE_SENTENCE * (chars // len(SAMPLE_SENTENCE) + 1))[:chars]
+        tokens = count_tokens(sample)
+        print(f"{chars:>6} chars = {tokens:>5} tokens -> {budget.plan(tokens)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def content_hash(*parts: str) -> str:
+    """Stable hex digest of one or more strings"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x1f")  # separator so ("ab", "c") != ("a", "bc")
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """Content-addressed cache for summaries: in-memory LRU with an optional SQLite file behind it"""
+
+    def __init__(self, max_entries: int = 256, path: Optional[str] = None):
+        self.max_entries = max(1, max_entries)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT NOT NULL)")
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached summary for `key`, or None on a miss"""
+        with self._lock:
+            summary = self._memory.get(key)
+            if summary is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return summary
+
+            if self._db is not None:
+                row = self._db.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, summary: str) -> None:
+        """Store a summary in memory and, if configured, on disk"""
+        with self._lock:
+            self._remember(key, summary)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO summaries (key, summary) VALUES (?, ?)", (key, summary))
+                self._db.commit()
+
+    def _remember(self, key: str, summary: str) -> None:
+        self._memory[key] = summary
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current in-memory size"""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._memory)}
+
+
+class ResultCache:
+    """SQLite-backed cache for generated comments with TTL and size-based eviction"""
+
+    def __init__(self, path: str, ttl_seconds: float = 24 * 60 * 60, max_entries: int = 5000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached result for `key` unless it is missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Dict) -> None:
+        """Store a result, evicting the least recently used entries beyond `max_entries`"""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            self._db.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._db.commit()
+
+    def clear(self) -> None:
+        """Drop every cached result"""
+        with self._lock:
+            self._db.execute("DELETE FROM results")
+            self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and number of stored results"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
@@ -1,166 +1,887 @@
+import json
+import re
 import time
 import random
-import traceback
-from typing import List, Dict
-from agents import AgentRegistry
-from crewai import Agent, Task, Crew
+import threading
+from collections import OrderedDict
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, Callable, Iterator, List, Dict, Optional, Tuple
+from agents import AgentRegistry, get_shared_llm
+from cache import ResultCache, SummaryCache, content_hash
+from deadlines import CANCEL_POLL_SECONDS, CallTimeout, Deadline, call_with_deadline, check_call
+from dedup import DEFAULT_DUPLICATE_THRESHOLD, NearDuplicateIndex
+from llm_backends import estimate_tokens
+from metrics import PROCESS_METRICS, CallRecord, MetricsCollector
+from prompt_budget import (DEFAULT_CONTENT_TOKENS, PASS_THROUGH, SUMMARIZE, PromptBudget, compact_prompt,
+                           count_tokens, truncate_to_tokens)
+from ratelimit import RateLimiter, get_rate_limiter
+from routing import ModelRouter, Route, load_default_router
+from runtime import load_crewai, load_litellm
 from textwrap import shorten
 
+if TYPE_CHECKING:
+    from crewai import Agent
+
+
+# Default number of comment generations kept in flight at once
+DEFAULT_MAX_CONCURRENCY = 4
+
+SUMMARY_PROMPT = "Summarize this text into <={words} words:\n\n{content}"
+
+# Map-reduce summarization of long content: chunk summaries, then one reduced summary
+DEFAULT_CHUNK_CHARS = 4000
+DEFAULT_SUMMARY_FANOUT = 4
+CHUNK_SUMMARY_WORDS = 120
+CHUNK_FALLBACK_CHARS = 600
+# On average one in this many pieces may end a chunk (content-defined boundaries)
+CHUNK_BOUNDARY_MODULUS = 4
+# Chunk summaries remembered per session for incremental re-summarization of edited drafts
+CHUNK_INDEX_SIZE = 256
+CHUNK_SUMMARY_PROMPT = "Summarize this section of a longer text into <={words} words, keeping its key points:\n\n{content}"
+REDUCE_PROMPT = "These are summaries of consecutive sections of one text. Combine them into a single summary of <={words} words:\n\n{content}"
+# Summaries are asked for in words; this many words fit the content token budget
+WORDS_PER_TOKEN = 0.75
+
+# Multi-turn reply threads: the newest turns go into the prompt verbatim (between
+# THREAD_RECENT_TURNS and twice that), older ones are folded into a running summary
+THREAD_RECENT_TURNS = 4
+THREAD_SUMMARY_WORDS = 80
+# Content excerpt carried by every reply prompt; the thread matters more than the post by then
+REPLY_CONTENT_TOKENS = 100
+THREAD_SUMMARY_PROMPT = "Summarize this social media discussion thread into <={words} words, keeping who argued what:\n\n{content}"
+
+# Bump whenever a comment prompt changes so cached results from older prompts are not reused
+PROMPT_VERSION = "2"
+
+# Prompt templates are written readably here and compacted once: indentation costs tokens on every call
+COMMENT_PROMPT = compact_prompt("""
+    You are commenting on this content: "{content}"
+    {diversity_hint}
+    Write a short realistic social media comment that reflects your personality and goals:
+    authentic to your character, 1-3 sentences, casual social media style, engaging and realistic.
+    Write only the comment itself, responding directly to the content; no meta-commentary or explanations.
+    """)
+DIVERSITY_HINT = compact_prompt("""
+    Someone already posted: "{avoid}"
+    Make a clearly different point in different words; do not repeat or paraphrase it.
+    """)
+BATCH_PROMPT = compact_prompt("""
+    You are commenting on this content: "{content}"
+    Write {count} different short realistic social media comments that reflect your personality and goals.
+    Each one: authentic to your character, 1-3 sentences, casual social media style, engaging, realistic and different from the others.
+    Respond with ONLY a JSON array of exactly {count} strings, one comment per string, e.g. ["first comment", "second comment"].
+    No meta-commentary, numbering or explanations.
+    """)
+REPLY_PROMPT = compact_prompt("""
+    You are participating in a social media discussion.
+    Original content: "{content}"
+    Original comment from {comment_author}: "{comment_text}"{earlier}
+    Most recent replies in the thread, oldest first:
+    {recent}
+
+    Write a realistic social media reply from your persona ({persona}) to the user's latest reply:
+    authentic to your character and consistent with what you said earlier in the thread, 1-2 sentences,
+    casual social media style, engaging and realistic, directly addressing the user's latest reply.
+    Write only the reply itself, responding directly to the user; no meta-commentary or explanations.
+    """)
+
+FAILED_COMMENT_TEXT = "[Comment generation failed ....."
+# Model output failing these checks escalates to the next model of its route
+MIN_COMMENT_CHARS = 8
+MAX_COMMENT_CHARS = 280
+META_PREFIXES = ("here's", "here is", "as an ai", "i'm sorry", "i cannot", "i can't", "sure,", "thought:", "final answer")
+# Stands in for comments still unfinished when a request's time budget runs out
+PENDING_COMMENT_TEXT = "[Still generating: this comment did not make the time budget]"
+
+# Longest a single model call may take unless the request deadline is sooner
+DEFAULT_CALL_TIMEOUT = 60.0
+# Slow calls get a hedged duplicate after the recent p95 latency, once this many calls were timed
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 1.0
+
+# Extra calls allowed for regenerating near-duplicate comments, as a share of the requested count
+DUPLICATE_REGENERATION_RATIO = 0.25
+
+# Completion budget reserved against the tokens/min limit before the real usage is known
+COMPLETION_TOKEN_ESTIMATE = 150
+
+
+SUMMARIZER_NAME = "Summarizer"
+
+
+def _build_summarizer_agent(llm=None) -> "Agent":
+    kwargs = {"llm": llm} if llm is not None else {}
+    return load_crewai().Agent(
+        name=SUMMARIZER_NAME,
+        role="Condenses long content",
+        goal="Summarize input into <=200 words while preserving key ideas",
+        backstory="Expert at summarizing long text into digestible summaries",
+        **kwargs
+    )
+
+
+@lru_cache(maxsize=None)
+def get_shared_summarizer_agent(api_key: Optional[str] = None, model: Optional[str] = None) -> "Agent":
+    """Summarizer agent shared by every engine in the process with the same API key and model"""
+    return _build_summarizer_agent(get_shared_llm(api_key, model) if api_key and model else None)
 
 
 class CommentEngine:
     """Generates realistic comments using CrewAI agents"""
     
-    def __init__(self, agent_registry: AgentRegistry):
+    def __init__(self, agent_registry: AgentRegistry, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 summary_cache: Optional[SummaryCache] = None, result_cache: Optional[ResultCache] = None,
+                 metrics: Optional[MetricsCollector] = None, rate_limited: bool = True,
+                 chunk_chars: int = DEFAULT_CHUNK_CHARS, summary_fanout: int = DEFAULT_SUMMARY_FANOUT,
+                 duplicate_threshold: float = DEFAULT_DUPLICATE_THRESHOLD,
+                 regeneration_ratio: float = DUPLICATE_REGENERATION_RATIO,
+                 call_timeout: Optional[float] = DEFAULT_CALL_TIMEOUT, hedge: bool = True,
+                 router: Optional[ModelRouter] = None, content_tokens: int = DEFAULT_CONTENT_TOKENS):
         self.agent_registry = agent_registry
+        self.max_concurrency = max(1, max_concurrency)
+        self.summary_cache = summary_cache if summary_cache is not None else SummaryCache()
+        self.chunk_chars = max(1000, chunk_chars)
+        self.summary_fanout = max(1, summary_fanout)
+        self.duplicate_threshold = duplicate_threshold
+        self.regeneration_ratio = max(0.0, regeneration_ratio)
+        self.call_timeout = call_timeout
+        self.hedge = hedge
+        self.router = router if router is not None else load_default_router()
+        self.content_tokens = content_tokens
+        # chunk hash -> chunk summary for the drafts summarized in this session
+        self._chunk_index: "OrderedDict[str, str]" = OrderedDict()
+        self._chunk_index_lock = threading.Lock()
+        # Opt-in: without a result cache every call goes to the model
+        self.result_cache = result_cache
+        self.metrics = metrics if metrics is not None else MetricsCollector(parent=PROCESS_METRICS)
+        self._call_context = threading.local()
+        # Calls on a real API key go through the process-wide limiter for that key
+        self.rate_limited = rate_limited
 
-        self.summarizer_agent = Agent(
-            name="Summarizer",
-            role="Condenses long content",
-            goal="Summarize input into <=200 words while preserving key ideas",
-            backstory="Expert at summarizing long text into digestible summaries"
-        )
+        self._offline_summarizer = None
+
+    @property
+    def summarizer_agent(self) -> "Agent":
+        """Summarizer agent on the first model of the summary route, created on first use"""
+        return self._summarizer_on(self._route("summary", SUMMARIZER_NAME)[0])
 
-    def _prepare_content(self, content: str, max_chars: int = 800) -> str:
-        """Summarize or truncate overly long content"""
-        if len(content) > max_chars:
+    def _summarizer_on(self, model: Optional[str]) -> "Agent":
+        registry_llm = getattr(self.agent_registry, "llm", None)
+        if registry_llm is not None:
+            # Offline registries must not fall back to a live default provider
+            if self._offline_summarizer is None:
+                self._offline_summarizer = _build_summarizer_agent(registry_llm)
+            return self._offline_summarizer
+        return get_shared_summarizer_agent(getattr(self.agent_registry, "api_key", None), model)
+
+    def _route(self, stage: str, persona: Optional[str]) -> Route:
+        """Models a call escalates through; (None,) runs the agent on its own llm
+
+        Offline registries (and keyless test doubles) have no model choice to make.
+        """
+        if getattr(self.agent_registry, "llm", None) is not None or not getattr(self.agent_registry, "api_key", None):
+            return (None,)
+        return self.router.models_for(stage, persona)
+
+    def _agent_on_model(self, agent: "Agent", model: Optional[str]) -> "Agent":
+        if model is None or model == getattr(getattr(agent, "llm", None), "model", None):
+            return agent
+        if agent.name == SUMMARIZER_NAME:
+            return self._summarizer_on(model)
+        return self.agent_registry.get_agent_on_model(agent.name, model)
+
+    def _summary_cache_key(self, prompt: str) -> str:
+        """Cache key covering the full summarizer prompt and the summarizer persona/model route"""
+        agent = self.summarizer_agent
+        model = getattr(getattr(agent, "llm", None), "model", "") or ""
+        route = "|".join(str(m) for m in self._route("summary", SUMMARIZER_NAME))
+        return content_hash(agent.role, agent.goal, agent.backstory, str(model), route, prompt)
+
+    def _cached_summary(self, prompt: str) -> str:
+        """Run one summarizer call, served from the summary cache when possible"""
+        cache_key = self._summary_cache_key(prompt)
+        cached = self.summary_cache.get(cache_key)
+        if cached is not None:
+            self.metrics.record(CallRecord(stage="summary", persona=self.summarizer_agent.name, cache_hit=True))
+            return cached
+        
+        summary = self._kickoff(self.summarizer_agent, prompt, "Concise summary of the text", stage="summary",
+                                validate=lambda text: self._valid_summary(text, prompt))
+        if summary:
+            self.summary_cache.set(cache_key, summary)
+        return summary
+
+    def _split_chunks(self, content: str, chunk_chars: int) -> List[str]:
+        """Split text into chunks of at most `chunk_chars`, on paragraph, then sentence, then word boundaries"""
+        # (text, separator used to glue it to the previous piece)
+        pieces: List[Tuple[str, str]] = []
+        for paragraph in re.split(r"\n\s*\n", content):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if len(paragraph) <= chunk_chars:
+                pieces.append((paragraph, "\n\n"))
+                continue
+            separator = "\n\n"
+            for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+                while len(sentence) > chunk_chars:
+                    cut = sentence.rfind(" ", 0, chunk_chars)
+                    cut = cut if cut > 0 else chunk_chars
+                    pieces.append((sentence[:cut], separator))
+                    sentence = sentence[cut:].lstrip()
+                    separator = " "
+                if sentence:
+                    pieces.append((sentence, separator))
+                    separator = " "
+        
+        # Pack pieces back together up to the chunk size. Chunks also end after a
+        # piece whose hash marks a boundary (content-defined chunking), so an edit
+        # only changes the chunks around it and later boundaries stay put.
+        chunks: List[str] = []
+        at_boundary = True
+        for piece, separator in pieces:
+            if not at_boundary and len(chunks[-1]) + len(separator) + len(piece) <= chunk_chars:
+                chunks[-1] = f"{chunks[-1]}{separator}{piece}"
+            else:
+                chunks.append(piece)
+            at_boundary = (
+                len(chunks[-1]) >= chunk_chars // 2
+                and int(content_hash(piece)[:8], 16) % CHUNK_BOUNDARY_MODULUS == 0
+            )
+        return chunks
+
+    def _summarize_chunk(self, chunk: str) -> str:
+        """Map step: summarize one chunk, truncating it if the call fails
+        
+        Summaries of chunks from earlier drafts come from the session's chunk
+        index, so re-preparing an edited draft only summarizes changed chunks.
+        """
+        chunk_key = content_hash(chunk)
+        with self._chunk_index_lock:
+            summary = self._chunk_index.get(chunk_key)
+            if summary is not None:
+                self._chunk_index.move_to_end(chunk_key)
+        if summary is not None:
+            self.metrics.record(CallRecord(stage="summary", persona=self.summarizer_agent.name, cache_hit=True))
+            return summary
+        
+        try:
+            summary = self._cached_summary(CHUNK_SUMMARY_PROMPT.format(words=CHUNK_SUMMARY_WORDS, content=chunk))
+        except Exception:
+            summary = ""
+        if not summary:
+            return shorten(chunk, width=CHUNK_FALLBACK_CHARS, placeholder="...")
+        
+        with self._chunk_index_lock:
+            self._chunk_index[chunk_key] = summary
+            while len(self._chunk_index) > CHUNK_INDEX_SIZE:
+                self._chunk_index.popitem(last=False)
+        return summary
+
+    def _summarize_chunked(self, content: str, words: int) -> str:
+        """Map-reduce summary: chunks are summarized in parallel, then reduced to one summary"""
+        chunks = self._split_chunks(content, self.chunk_chars)
+        workers = max(1, min(self.summary_fanout, len(chunks)))
+        # Pool threads start with an empty call context: carry the request's deadline and cancel event over
+        deadline = getattr(self._call_context, "deadline", None)
+        cancel = getattr(self._call_context, "cancel", None)
+        
+        def summarize_chunk(chunk: str) -> str:
+            self._set_request_scope(deadline, cancel)
             try:
-                summary_task = Task(
-                    description=f"Summarize this text into <=200 words:\n\n{content}",
-                    agent=self.summarizer_agent,
-                    expected_output="Concise summary of the text"
-                )
-                crew = Crew(agents=[self.summarizer_agent], tasks=[summary_task], verbose=False)
-                summary = str(crew.kickoff()).strip()
-                return summary if summary else shorten(content, width=max_chars, placeholder="... [truncated]")
+                return self._summarize_chunk(chunk)
+            finally:
+                self._set_request_scope(None, None)
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="yapyard-summary") as executor:
+            partials = list(executor.map(summarize_chunk, chunks))
+        
+        combined = "\n\n".join(partials)
+        if len(combined) >= len(content):
+            # Summaries did not shrink the text; stop rather than recurse forever
+            combined = shorten(combined, width=self.chunk_chars, placeholder="... [truncated]")
+        elif len(combined) > self.chunk_chars:
+            # Too many partial summaries for one reduce prompt: reduce them in another round
+            return self._summarize_chunked(combined, words)
+        return self._cached_summary(REDUCE_PROMPT.format(words=words, content=combined))
+
+    def _prompt_budget(self, stage: str = "comment") -> PromptBudget:
+        """Token budget of the first model a stage's calls go to"""
+        return PromptBudget(self._route(stage, None)[0], self.content_tokens)
+
+    def _fit_content(self, content: str, max_tokens: Optional[int] = None) -> Tuple[str, int]:
+        """Fit content into the comment model's token budget; returns it and the prompt tokens this saves
+        
+        Content within budget passes through untouched and content just over
+        it is trimmed. Longer content is summarized (map-reduce style when it
+        is too long for one summarizer prompt). The plan always follows the
+        comment budget: a tighter `max_tokens` (replies) only trims locally,
+        so it never costs a summarizer call a comment would not make.
+        """
+        budget = self._prompt_budget()
+        tokens = count_tokens(content)
+        plan = budget.plan(tokens)
+        if plan == PASS_THROUGH and tokens <= budget.limit(max_tokens):
+            return content, 0
+        
+        summary = ""
+        if plan == SUMMARIZE:
+            # Sized to the full content budget so comments and replies share one cached summary
+            words = max(1, int(budget.content_tokens * WORDS_PER_TOKEN))
+            try:
+                if len(content) <= self.chunk_chars and self._prompt_budget("summary").fits_one_summary(tokens):
+                    summary = self._cached_summary(SUMMARY_PROMPT.format(words=words, content=content))
+                else:
+                    summary = self._summarize_chunked(content, words)
             except Exception:
                 # fallback: safe truncation
-                return shorten(content, width=max_chars, placeholder="... [truncated]")
-        return content
-    
-    def generate_comments(self, content: str, selected_agents: List[str], num_comments: int) -> List[Dict]:
-        """Generate comments from selected agents"""
+                summary = ""
+        fitted = truncate_to_tokens(summary or content, budget.limit(max_tokens))
+        return fitted, max(0, tokens - count_tokens(fitted))
+
+    def _prepare_content(self, content: str, max_tokens: Optional[int] = None) -> str:
+        """Summarize or truncate content over the token budget; see `_fit_content`"""
+        return self._fit_content(content, max_tokens)[0]
+
+    def _kickoff(self, agent: "Agent", description: str, expected_output: str,
+                 stage: str = "comment", retries: int = 0,
+                 validate: Optional[Callable[[str], bool]] = None) -> str:
+        """Run one model call for one agent down its model route and return the raw text output
+        
+        The call goes to the first model routed for the agent and `stage`; an
+        output failing `validate` is retried on the next model. The last
+        model's output is returned whether it validates or not.
+        """
+        route = self._route(stage, agent.name)
+        for model in route[:-1]:
+            text, valid = self._call_model(self._agent_on_model(agent, model), description, expected_output,
+                                           stage, retries, validate)
+            if valid:
+                return text
+        return self._call_model(self._agent_on_model(agent, route[-1]), description, expected_output,
+                                stage, retries, validate)[0]
+
+    def _call_model(self, agent: "Agent", description: str, expected_output: str, stage: str, retries: int,
+                    validate: Optional[Callable[[str], bool]]) -> Tuple[str, bool]:
+        """One model call, recording its metrics; returns the text and whether it passed `validate`"""
+        # Queue wait is set by the worker that picked this job up; only its first call waited
+        queue_wait_ms = getattr(self._call_context, "queue_wait_ms", 0.0)
+        self._call_context.queue_wait_ms = 0.0
+        model = getattr(getattr(agent, "llm", None), "model", "") or ""
+        record = CallRecord(stage=stage, persona=agent.name or "", model=str(model),
+                            queue_wait_ms=queue_wait_ms, retries=retries,
+                            measured_prompt_tokens=count_tokens(description),
+                            tokens_saved=getattr(self._call_context, "tokens_saved", 0))
+        limiter = self._rate_limiter_for(agent)
+        cancel = getattr(self._call_context, "cancel", None)
+        timeout = self._call_timeout()
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        
+        # Attempts run on their own threads, which outlive an abandoned call: each one checks
+        # the cancel event and the expiry itself before anything is sent
+        def attempt() -> Tuple[Tuple[str, Dict[str, int]], int]:
+            if limiter is None:
+                check_call(cancel, expires_at)
+                return self._run_model(agent, description, expected_output), 0
+            estimated = record.measured_prompt_tokens + COMPLETION_TOKEN_ESTIMATE
+            return limiter.call(
+                lambda: self._run_model(agent, description, expected_output),
+                estimated_tokens=estimated,
+                actual_tokens=lambda result: sum(result[1].values()) or estimated,
+                cancel=cancel, expires_at=expires_at
+            )
+        
+        started = time.perf_counter()
+        try:
+            ((text, usage), retried), record.hedged = call_with_deadline(
+                attempt, timeout=timeout, hedge_after=self._hedge_delay(), cancel=cancel
+            )
+            record.retries += retried
+        except Exception as e:
+            record.failure = type(e).__name__
+            raise
+        else:
+            record.prompt_tokens = usage.get("prompt_tokens", 0)
+            record.completion_tokens = usage.get("completion_tokens", 0)
+            record.rejected = validate is not None and not validate(text)
+            return text, not record.rejected
+        finally:
+            record.wall_ms = (time.perf_counter() - started) * 1000
+            self.metrics.record(record)
+
+    def _call_timeout(self) -> Optional[float]:
+        """Per-call timeout, shortened to what is left of the current request's deadline"""
+        deadline = getattr(self._call_context, "deadline", None)
+        if deadline is None:
+            return self.call_timeout
+        return deadline.remaining() if self.call_timeout is None else min(self.call_timeout, deadline.remaining())
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds before a slow call is hedged: the recent p95, once enough calls were timed"""
+        if not self.hedge:
+            return None
+        p95_ms = self.metrics.latency_percentile(0.95, HEDGE_MIN_SAMPLES)
+        return None if p95_ms is None else max(HEDGE_MIN_DELAY_SECONDS, p95_ms / 1000)
+
+    def _set_request_scope(self, deadline: Optional[Deadline], cancel: Optional[threading.Event],
+                           tokens_saved: int = 0) -> None:
+        """Deadline, cancel event and content tokens saved for the model calls made on this thread"""
+        self._call_context.deadline = deadline
+        self._call_context.cancel = cancel
+        self._call_context.tokens_saved = tokens_saved
+
+    def _rate_limiter_for(self, agent: "Agent") -> Optional[RateLimiter]:
+        """Shared limiter for the agent's API key; None when unlimited (offline or keyless LLMs)"""
+        api_key = getattr(getattr(agent, "llm", None), "api_key", None)
+        if not self.rate_limited or not api_key:
+            return None
+        return get_rate_limiter(api_key)
+
+    def _run_model(self, agent: "Agent", description: str, expected_output: str) -> Tuple[str, Dict[str, int]]:
+        """Run a single-task crew for one agent; returns the text and its token usage"""
+        # Agents are pooled across sessions and threads, and CrewAI keeps executor
+        # state on the agent, so every kickoff works on its own copy
+        crewai = load_crewai()
+        agent = agent.copy()
+        task = crewai.Task(
+            description=description,
+            agent=agent,
+            expected_output=expected_output
+        )
+        
+        # Create a crew with just this agent
+        crew = crewai.Crew(
+            agents=[agent],
+            tasks=[task],
+            verbose=False
+        )
+        output = crew.kickoff()
+        usage = getattr(output, "token_usage", None)
+        return str(output).strip(), {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        }
+
+    def _comment_dict(self, author: str, text: str) -> Dict:
+        """Wrap generated text into the comment shape the UI expects"""
+        return {
+            'author': author,
+            'text': text,
+            'timestamp': f"{random.randint(1, 60)}m ago"
+        }
+
+    def _failed_comment(self, author: str, error: Optional[Exception] = None) -> Dict:
+        """Fallback comment used when generation fails (or is cut off by the request deadline)"""
+        deadline = getattr(self._call_context, "deadline", None)
+        # A call given up on because it could not finish in the budget counts as cut off too
+        if deadline is not None and (deadline.expired or isinstance(error, CallTimeout)):
+            return self._pending_comment(author)
+        return self._comment_dict(author, FAILED_COMMENT_TEXT)
+
+    def _pending_comment(self, author: str) -> Dict:
+        """Placeholder for a comment the time budget ran out on"""
+        comment = self._comment_dict(author, PENDING_COMMENT_TEXT)
+        comment['pending'] = True
+        return comment
+
+    def _comment_task_description(self, safe_content: str, avoid: Optional[str] = None) -> str:
+        """Build the prompt for a single top-level comment
+        
+        `avoid` is an already posted comment the new one must not resemble.
+        """
+        diversity_hint = DIVERSITY_HINT.format(avoid=avoid) if avoid else ""
+        return COMMENT_PROMPT.format(content=safe_content, diversity_hint=diversity_hint)
+
+    def _batch_task_description(self, safe_content: str, count: int) -> str:
+        """Build the prompt asking one agent for several distinct comments at once"""
+        return BATCH_PROMPT.format(content=safe_content, count=count)
+
+    def _generate_single_comment(self, agent_name: str, agent: "Agent", safe_content: str,
+                                 avoid: Optional[str] = None) -> Dict:
+        """Run one comment task for one agent, falling back to a placeholder on failure"""
+        try:
+            # Generate the comment
+            comment_text = self._kickoff(
+                agent,
+                self._comment_task_description(safe_content, avoid),
+                "A single social media comment responding to the content",
+                stage="regenerate" if avoid else "comment",
+                validate=self._valid_comment
+            )
+            
+            # Clean up the comment (remove any unwanted formatting)
+            return self._comment_dict(agent_name, self._clean_comment(comment_text))
+        except Exception as e:
+            return self._failed_comment(agent_name, e)
+
+    def _parse_comment_list(self, raw: str) -> List[str]:
+        """Extract the comments from a JSON-array response, dropping invalid items"""
+        start, end = raw.find('['), raw.rfind(']')
+        if start == -1 or end <= start:
+            return []
+        try:
+            items = json.loads(raw[start:end + 1])
+        except ValueError:
+            return []
+        if not isinstance(items, list):
+            return []
+        
         comments = []
+        for item in items:
+            if isinstance(item, str) and item.strip():
+                comments.append(self._clean_comment(item))
+        return comments
+
+    def _generate_comment_batch(self, agent_name: str, agent: "Agent", safe_content: str, count: int) -> List[Dict]:
+        """Generate `count` comments for one agent in a single request
+        
+        Missing or invalid items are requested once more; anything still missing
+        after the retry becomes a fallback comment so the batch is always full.
+        """
+        texts: List[str] = []
+        error: Optional[Exception] = None
+        for attempt in range(2):
+            missing = count - len(texts)
+            if missing <= 0:
+                break
+            try:
+                raw = self._kickoff(
+                    agent,
+                    self._batch_task_description(safe_content, missing),
+                    f"A JSON array of {missing} social media comments responding to the content",
+                    stage="batch",
+                    retries=attempt,
+                    validate=lambda text: len(self._parse_comment_list(text)) >= missing
+                )
+                texts.extend(self._parse_comment_list(raw)[:missing])
+            except Exception as e:
+                error = e
+                continue
+        
+        comments = [self._comment_dict(agent_name, text) for text in texts]
+        comments.extend(self._failed_comment(agent_name, error) for _ in range(count - len(comments)))
+        return comments
+
+    def _plan_allocation(self, agent_names: List[str], num_comments: int, seed: Optional[int] = None) -> List[str]:
+        """Randomly select an agent name from the pool for every comment slot"""
+        rng = random.Random(seed) if seed is not None else random
+        return [rng.choice(agent_names) for _ in range(num_comments)]
+
+    def _result_cache_keys(self, content: str, planned_authors: List[str], seed: Optional[int], batched: bool) -> List[str]:
+        """One result-cache key per comment slot"""
+        mode = "batch" if batched else "single"
+        content_key = content_hash(content)
+        fingerprints = {
+            name: content_hash(self.agent_registry.agent_fingerprint(name), *map(str, self._route("comment", name)))
+            for name in set(planned_authors)
+        }
+        return [
+            content_hash(content_key, fingerprints[name], PROMPT_VERSION, mode, str(seed), str(slot))
+            for slot, name in enumerate(planned_authors)
+        ]
+
+    def iter_comments(self, content: str, selected_agents: List[str], num_comments: int,
+                      max_concurrency: Optional[int] = None, batched: bool = False,
+                      fresh: bool = False, seed: Optional[int] = None, dedupe: bool = True,
+                      warm: Optional[Dict[int, Dict]] = None,
+                      only_slots: Optional[List[int]] = None, deadline: Optional[float] = None,
+                      cancel: Optional[threading.Event] = None) -> Iterator[Tuple[int, Dict]]:
+        """Yield `(slot, comment)` pairs as soon as each comment is ready
+        
+        Slots index into the planned comment order, so callers can render in
+        arrival order and still rebuild the ordered list. Cached comments come
+        first; closing the iterator early cancels requests that have not started.
+        
+        With `dedupe`, a comment too similar to one already yielded is held
+        back and its slot regenerated with a diversity hint, up to
+        `regeneration_ratio` extra calls per request; past that cap,
+        duplicates are yielded as they are. A slot whose regeneration fails or
+        runs out of time gets the held-back comment back.
+        
+        `warm` holds comments already generated for some slots of this exact
+        request (see prewarm.Prewarmer); they are yielded first and not regenerated.
+        `only_slots` restricts generation to those slots of the plan.
+        
+        `deadline` is the request's time budget in seconds. Every call is
+        bounded by it (and by the engine's `call_timeout`); when it runs out,
+        the slots not finished yet are yielded as pending placeholders
+        (`comment['pending']`). Setting `cancel` abandons in-flight calls and
+        ends the iteration without yielding anything more.
+        """
+        budget = Deadline(deadline) if deadline is not None else None
         agents = self.agent_registry.get_all_agents()
         
         # Create a pool of selected agent names
         selected_agent_names_pool = [name for name in selected_agents if name in agents]
         
         if not selected_agent_names_pool:
-            return []
+            return
+
+        # Reading from the cache needs a reproducible plan, so derive the seed from the request;
+        # a fresh run keeps a random allocation on every call
+        if seed is None and self.result_cache is not None and not fresh:
+            seed = int(content_hash(content, *selected_agent_names_pool, str(num_comments))[:12], 16)
+        
+        planned_authors = self._plan_allocation(selected_agent_names_pool, num_comments, seed)
+        pending_slots = list(range(len(planned_authors)))
+        if only_slots is not None:
+            pending_slots = [slot for slot in pending_slots if slot in set(only_slots)]
+        
+        seen = NearDuplicateIndex(self.duplicate_threshold) if dedupe else None
+        regenerations_left = int(round(num_comments * self.regeneration_ratio)) if dedupe else 0
+        
+        warm = {slot: comment for slot, comment in (warm or {}).items() if 0 <= slot < len(planned_authors)}
+        for slot in sorted(warm):
+            if seen is not None:
+                seen.add(warm[slot]['text'])
+            yield slot, warm[slot]
+        pending_slots = [slot for slot in pending_slots if slot not in warm]
+        
+        cache_keys: List[str] = []
+        # Without a seed the plan cannot be reproduced, so its slots could never be read back
+        if self.result_cache is not None and seed is not None:
+            cache_keys = self._result_cache_keys(content, planned_authors, seed, batched)
+            if not fresh:
+                uncached = []
+                for slot in pending_slots:
+                    cached = self.result_cache.get(cache_keys[slot])
+                    if cached:
+                        self.metrics.record(CallRecord(stage="comment", persona=cached['author'], cache_hit=True))
+                        if seen is not None:
+                            seen.add(cached['text'])
+                        yield slot, cached
+                    else:
+                        uncached.append(slot)
+                pending_slots = uncached
+        
+        if not pending_slots:
+            return
 
         # 🔹 ensure safe content
-        safe_content = self._prepare_content(content)
+        self._set_request_scope(budget, cancel)
+        try:
+            safe_content, tokens_saved = self._fit_content(content)
+        finally:
+            self._set_request_scope(None, None)
+        
+        # Group comment slots into jobs: one slot per job, or all of an agent's slots per job
+        if batched:
+            slots_by_author: Dict[str, List[int]] = {}
+            for slot in pending_slots:
+                slots_by_author.setdefault(planned_authors[slot], []).append(slot)
+            jobs = list(slots_by_author.items())
+        else:
+            jobs = [(planned_authors[slot], [slot]) for slot in pending_slots]
         
-        for i in range(num_comments):
-            # Randomly select an agent name from the pool
-            selected_agent_name = random.choice(selected_agent_names_pool)
-            selected_agent = agents[selected_agent_name] # Get the Agent object using the name
+        def run_job(name: str, slots: List[int], agent: "Agent", submitted_at: float,
+                    avoid: Optional[str] = None) -> List[Tuple[int, Dict]]:
+            if budget is not None and budget.expired:
+                # Queued past the deadline: no call would be in time
+                return [(slot, self._pending_comment(name)) for slot in slots]
+            self._call_context.queue_wait_ms = (time.perf_counter() - submitted_at) * 1000
+            self._set_request_scope(budget, cancel, tokens_saved)
+            try:
+                if batched and avoid is None:
+                    results = self._generate_comment_batch(name, agent, safe_content, len(slots))
+                else:
+                    results = [self._generate_single_comment(name, agent, safe_content, avoid)]
+            finally:
+                self._set_request_scope(None, None)
             
-            # Create a task for the agent
-            comment_task = Task(
-                description=f"""
-                You are commenting on this content: "{safe_content}"
-                
-                Write a short realistic social media comment that reflects your personality and goals.
-                The comment should be:
-                - Authentic to your character
-                - 1-3 sentences long
-                - Written in casual social media style
-                - Engaging and realistic
-                
-                Do not include any meta-commentary or explanations, just write the comment as if you're responding directly to the content.
-                """,
-                agent=selected_agent,
-                expected_output="A single social media comment responding to the content"
-            )
+            finished = list(zip(slots, results))
+            if cache_keys:
+                for slot, comment in finished:
+                    if comment['text'] != FAILED_COMMENT_TEXT and not comment.get('pending'):
+                        self.result_cache.set(cache_keys[slot], comment)
+            return finished
+        
+        def make_job(name: str, slots: List[int], avoid: Optional[str] = None):
+            return partial(run_job, name, slots, agents[name], time.perf_counter(), avoid)
+        
+        def screen(slot: int, comment: Dict):
+            """None to yield the comment, or the job regenerating its slot"""
+            nonlocal regenerations_left
+            if seen is None or comment['text'] == FAILED_COMMENT_TEXT or comment.get('pending'):
+                return None
+            similar = seen.find_similar(comment['text'])
+            if similar is not None and regenerations_left > 0:
+                regenerations_left -= 1
+                return make_job(comment['author'], [slot], similar)
+            seen.add(comment['text'])
+            return None
+        
+        unfinished = set(pending_slots)
+        # Near-duplicates being regenerated: the slot falls back to them if the regeneration fails
+        held: Dict[int, Dict] = {}
+        concurrency = self.max_concurrency if max_concurrency is None else max_concurrency
+        workers = max(1, min(concurrency, len(jobs)))
+        
+        def deliver(finished: List[Tuple[int, Dict]]) -> Iterator[Tuple[int, Dict]]:
+            if cancel is not None and cancel.is_set():
+                # Whatever comes back now is only the cancelled calls failing
+                return
+            for slot, comment in finished:
+                retry = screen(slot, comment)
+                if retry is None:
+                    unfinished.discard(slot)
+                    if comment['text'] == FAILED_COMMENT_TEXT or comment.get('pending'):
+                        comment = held.get(slot, comment)
+                    yield slot, comment
+                else:
+                    held.setdefault(slot, comment)
+                    resubmit(retry)
+        
+        if workers == 1:
+            queue = deque(make_job(name, slots) for name, slots in jobs)
             
-            # Create a crew with just this agent
-            crew = Crew(
-                agents=[selected_agent],
-                tasks=[comment_task],
-                verbose=False
-            )
+            def resubmit(job) -> None:
+                queue.append(job)
             
+            while queue and not (budget is not None and budget.expired) and not (cancel is not None and cancel.is_set()):
+                yield from deliver(queue.popleft()())
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="yapyard-comment")
             try:
-                # Generate the comment
-                result = crew.kickoff()
-                comment_text = str(result).strip()
-                
-                # Clean up the comment (remove any unwanted formatting)
-                comment_text = self._clean_comment(comment_text)
+                futures = {executor.submit(make_job(name, slots)) for name, slots in jobs}
                 
-                comments.append({
-                    'author': selected_agent_name,
-                    'text': comment_text,
-                    'timestamp': f"{random.randint(1, 60)}m ago"
-                })
+                def resubmit(job) -> None:
+                    futures.add(executor.submit(job))
                 
-            except Exception as e:
-                # Fallback comment if generation fails
-                comments.append({
-                    'author': selected_agent_name,
-                    'text': f"[Comment generation failed .....",
-                    'timestamp': f"{random.randint(1, 60)}m ago"
-                })
+                while futures and not (cancel is not None and cancel.is_set()):
+                    # Wake up periodically to notice cancellation; stop waiting once the budget is spent
+                    timeout = CANCEL_POLL_SECONDS if cancel is not None else None
+                    if budget is not None:
+                        timeout = budget.remaining() if timeout is None else min(timeout, budget.remaining())
+                    done, futures = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from deliver(future.result())
+                    if not done and budget is not None and budget.expired:
+                        break
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
         
-        return comments
+        if cancel is not None and cancel.is_set():
+            return
+        for slot in sorted(unfinished):
+            yield slot, held.get(slot) or self._pending_comment(planned_authors[slot])
+
+    def generate_comments(self, content: str, selected_agents: List[str], num_comments: int,
+                          max_concurrency: Optional[int] = None, batched: bool = False,
+                          fresh: bool = False, seed: Optional[int] = None, dedupe: bool = True,
+                          deadline: Optional[float] = None, cancel: Optional[threading.Event] = None) -> List[Dict]:
+        """Generate comments from selected agents
+        
+        Up to `max_concurrency` requests are in flight at once (defaults to the
+        engine setting); the returned list keeps the planned comment order. With
+        `batched=True` each selected agent gets one request for all of its comments.
+        When the engine has a result cache, cached slots are served from it unless
+        `fresh=True`. Only non-fresh runs write to the cache: a fresh run plans
+        its authors at random, so its slots could never be read back.
+        Near-duplicates are regenerated unless `dedupe=False`. With a `deadline`,
+        slots that miss it come back as pending placeholders (see `iter_comments`).
+        """
+        finished = dict(self.iter_comments(
+            content, selected_agents, num_comments,
+            max_concurrency=max_concurrency, batched=batched, fresh=fresh, seed=seed, dedupe=dedupe,
+            deadline=deadline, cancel=cancel
+        ))
+        return [finished[slot] for slot in sorted(finished)]
+
+    def _thread_turn_line(self, turn: Dict) -> str:
+        speaker = "User" if turn.get('from_user') else turn['author']
+        return f"{speaker}: {turn['text']}"
 
-    def generate_reply(self, original_content: str, original_comment_author: str, original_comment_text: str, user_reply: str, agent_to_reply: str) -> Dict:
-        """Generate a reply from a specific agent to a user's comment"""
+    def _thread_context(self, turns: List[Dict]) -> Tuple[str, List[Dict]]:
+        """Split a thread into a running summary of older turns and the recent turns kept verbatim
+        
+        Older turns are folded THREAD_RECENT_TURNS at a time, each fold
+        summarizing the previous summary plus the turns it adds. Fold
+        boundaries depend only on the turn count, so every fold but the newest
+        is a summary-cache hit and a reply costs at most one summary call.
+        """
+        folded = max(0, len(turns) - THREAD_RECENT_TURNS) // THREAD_RECENT_TURNS * THREAD_RECENT_TURNS
+        summary = ""
+        for start in range(0, folded, THREAD_RECENT_TURNS):
+            lines = [self._thread_turn_line(t) for t in turns[start:start + THREAD_RECENT_TURNS]]
+            if summary:
+                lines.insert(0, f"Summary of the thread so far: {summary}\n\nNew messages:")
+            try:
+                summary = self._cached_summary(
+                    THREAD_SUMMARY_PROMPT.format(words=THREAD_SUMMARY_WORDS, content="\n".join(lines))
+                ) or summary
+            except Exception:
+                # fallback: keep the older summary rather than failing the reply
+                pass
+        return summary, turns[folded:]
+
+    def generate_reply(self, original_content: str, original_comment_author: str, original_comment_text: str,
+                       user_reply: str, agent_to_reply: str, thread: Optional[List[Dict]] = None,
+                       deadline: Optional[float] = None, cancel: Optional[threading.Event] = None) -> Dict:
+        """Generate a reply from a specific agent to a user's comment
+        
+        `thread` holds the earlier turns under the comment, oldest first, as
+        reply dicts (user turns flagged with `from_user`). The prompt stays the
+        same size however long the thread gets; see `_thread_context`.
+        `deadline` (seconds) and `cancel` bound every call the reply makes.
+        """
         agents = self.agent_registry.get_all_agents()
         selected_agent = agents.get(agent_to_reply)
 
         if not selected_agent:
             raise ValueError(f"Agent '{agent_to_reply}' not found.")
 
-        safe_content = self._prepare_content(original_content)
-
-        reply_task = Task(
-            description=f"""
-            You are participating in a social media discussion.
-            Original content: "{safe_content}"
-            Original comment from {original_comment_author}: "{original_comment_text}"
-            User's reply to the original comment: "{user_reply}"
-
-            Your task is to generate a realistic social media reply from your persona ({agent_to_reply}) to the user's reply.
-            The reply should be:
-            - Authentic to your character and consistent with your previous comment (if any).
-            - 1-2 sentences long.
-            - Written in casual social media style.
-            - Engaging and realistic.
-            - Directly address the user's reply.
-
-            Do not include any meta-commentary or explanations, just write the reply as if you're responding directly to the user.
-            """,
-            agent=selected_agent,
-            expected_output="A single social media reply to the user's comment"
-        )
+        request_deadline = Deadline(deadline) if deadline is not None else None
+        self._set_request_scope(request_deadline, cancel)
+        try:
+            safe_content, tokens_saved = self._fit_content(original_content, REPLY_CONTENT_TOKENS)
+            self._set_request_scope(request_deadline, cancel, tokens_saved)
+            turns = list(thread or []) + [{'author': "You", 'text': user_reply, 'from_user': True}]
+            summary, recent = self._thread_context(turns)
+            reply_description = REPLY_PROMPT.format(
+                content=safe_content,
+                comment_author=original_comment_author,
+                comment_text=original_comment_text,
+                earlier=f'\nSummary of the earlier thread: "{summary}"' if summary else "",
+                recent="\n".join(self._thread_turn_line(t) for t in recent),
+                persona=agent_to_reply
+            )
 
-        crew = Crew(
-            agents=[selected_agent],
-            tasks=[reply_task],
-            verbose=False
-        )
+            try:
+                reply_text = self._kickoff(
+                    selected_agent,
+                    reply_description,
+                    "A single social media reply to the user's comment",
+                    stage="reply",
+                    validate=self._valid_comment
+                )
+                reply_text = self._clean_comment(reply_text)
 
-        try:
-            result = crew.kickoff()
-            reply_text = str(result).strip()
-            reply_text = self._clean_comment(reply_text)
-
-            return {
-                'author': agent_to_reply,
-                'text': reply_text,
-                'timestamp': f"{random.randint(1, 60)}s ago" # Replies are more recent
-            }
-        except Exception as e:
-            traceback_str = traceback.format_exc()
-            print(traceback_str)
-            return {
-                'author': selected_agent.name,
-                'text': f"[Reply generation failed: {str(e)}",
-                'timestamp': f"{random.randint(1, 60)}s ago"
-            }
+                return {
+                    'author': agent_to_reply,
+                    'text': reply_text,
+                    'timestamp': f"{random.randint(1, 60)}s ago" # Replies are more recent
+                }
+            except Exception as e:
+                # The failure is already recorded in the call metrics
+                return {
+                    'author': selected_agent.name,
+                    'text': f"[Reply generation failed: {str(e)}",
+                    'timestamp': f"{random.randint(1, 60)}s ago"
+                }
+        finally:
+            self._set_request_scope(None, None)
+
+    def _valid_comment(self, text: str) -> bool:
+        """Whether model output works as a comment or reply as is: not empty, not meta talk, not cut off"""
+        text = text.strip().strip('"')
+        lowered = text.lower()
+        return MIN_COMMENT_CHARS <= len(text) <= MAX_COMMENT_CHARS and not lowered.startswith(META_PREFIXES)
+
+    def _valid_summary(self, text: str, prompt: str) -> bool:
+        """Whether a summary is usable: not empty and actually shorter than what it summarizes"""
+        return bool(text.strip()) and len(text) < len(prompt) and not text.lower().startswith(META_PREFIXES)
 
     def _clean_comment(self, comment: str) -> str:
         """Clean up generated comment text"""
@@ -181,4 +902,64 @@ class CommentEngine:
         if comment.startswith('"') and comment.endswith('"'):
             comment = comment[1:-1]
         
-        return comment[:280]  # Limit length like Twitter
\ No newline at end of file
+        return comment[:MAX_COMMENT_CHARS]  # Limit length like Twitter
+
+
+def render_persona_prompt(agent: "Agent") -> str:
+    """Render an agent's persona as a system prompt (the same fields CrewAI puts in its own)"""
+    return f"You are {agent.role}. {agent.backstory}\nYour personal goal is: {agent.goal}"
+
+
+class DirectCommentEngine(CommentEngine):
+    """CommentEngine backend that calls the model directly instead of going through Crew/Task
+    
+    The persona becomes the system prompt and the task prompt the user message,
+    so each comment costs one litellm completion and none of CrewAI's executor
+    overhead. Agents without their own LLM still run through CrewAI, and
+    non-litellm LLMs (the offline backends) are called through their own `call`.
+    """
+
+    def _run_model(self, agent: "Agent", description: str, expected_output: str) -> Tuple[str, Dict[str, int]]:
+        llm = getattr(agent, "llm", None)
+        if llm is None or not getattr(llm, "model", None):
+            return super()._run_model(agent, description, expected_output)
+        
+        messages = [
+            {"role": "system", "content": render_persona_prompt(agent)},
+            {"role": "user", "content": f"{description.strip()}\n\nExpected output: {expected_output}"},
+        ]
+        if not isinstance(llm, load_crewai().LLM):
+            text = str(llm.call(messages)).strip()
+            return text, {
+                "prompt_tokens": sum(estimate_tokens(m["content"]) for m in messages),
+                "completion_tokens": estimate_tokens(text),
+            }
+        
+        params = {"model": llm.model, "messages": messages}
+        for name in ("api_key", "base_url", "temperature", "max_tokens"):
+            value = getattr(llm, name, None)
+            if value is not None:
+                params[name] = value
+        
+        response = load_litellm().completion(**params)
+        usage = getattr(response, "usage", None)
+        return (response.choices[0].message.content or "").strip(), {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        }
+
+
+# Engine backends selectable by name (e.g. via the YAPYARD_ENGINE env var)
+ENGINE_BACKENDS = {
+    "crew": CommentEngine,
+    "direct": DirectCommentEngine,
+}
+
+
+def create_comment_engine(agent_registry: AgentRegistry, backend: str = "crew", **kwargs) -> CommentEngine:
+    """Build the comment engine for the configured backend"""
+    try:
+        engine_class = ENGINE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown engine backend '{backend}'. Choose from: {', '.join(ENGINE_BACKENDS)}")
+    return engine_class(agent_registry, **kwargs)
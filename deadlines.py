@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+# How often a waiting call checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.1
+
+
+class CallTimeout(Exception):
+    """The call (and its hedge, if any) did not answer within its timeout"""
+
+
+class CallCancelled(Exception):
+    """The caller cancelled the request the call belonged to"""
+
+
+class Deadline:
+    """Absolute point in time a request must finish by"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+def check_call(cancel: Optional[threading.Event] = None, expires_at: Optional[float] = None) -> None:
+    """Raise when a call about to be sent was cancelled or is past its `time.monotonic()` expiry"""
+    if cancel is not None and cancel.is_set():
+        raise CallCancelled("Request cancelled")
+    if expires_at is not None and time.monotonic() >= expires_at:
+        raise CallTimeout("No time left for the call")
+
+
+def _start(fn: Callable[[], T]) -> "Future[T]":
+    """Run `fn` on its own daemon thread; a hung call then only costs that thread"""
+    future: "Future[T]" = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="yapyard-call", daemon=True).start()
+    return future
+
+
+def call_with_deadline(fn: Callable[[], T], timeout: Optional[float] = None, hedge_after: Optional[float] = None,
+                       cancel: Optional[threading.Event] = None) -> Tuple[T, bool]:
+    """Run `fn` with a timeout, an optional hedge and cancellation; returns its result and whether it hedged
+
+    If `fn` has not answered after `hedge_after` seconds, an identical second
+    attempt starts and whichever finishes first wins. Abandoned attempts run to
+    completion in the background; their results are dropped.
+    """
+    # Nothing is sent once the request is cancelled or its budget is spent
+    check_call(cancel)
+    if timeout is not None and timeout <= 0:
+        raise CallTimeout("No time left for the call")
+    started = time.monotonic()
+    pending: List[Future] = [_start(fn)]
+    hedged = False
+    first_error: Optional[BaseException] = None
+    while pending:
+        if cancel is not None and cancel.is_set():
+            raise CallCancelled("Request cancelled")
+        elapsed = time.monotonic() - started
+        if timeout is not None and elapsed >= timeout:
+            raise CallTimeout(f"No response within {timeout:.1f}s")
+        if not hedged and hedge_after is not None and elapsed >= hedge_after:
+            pending.append(_start(fn))
+            hedged = True
+
+        waits = [
+            CANCEL_POLL_SECONDS if cancel is not None else None,
+            timeout - elapsed if timeout is not None else None,
+            hedge_after - elapsed if hedge_after is not None and not hedged else None,
+        ]
+        done, not_done = wait(pending, timeout=min((w for w in waits if w is not None), default=None),
+                              return_when=FIRST_COMPLETED)
+        for attempt in done:
+            if attempt.exception() is None:
+                return attempt.result(), hedged
+            first_error = first_error or attempt.exception()
+        pending = list(not_done)
+    # Hedging is not a retry: if every running attempt failed, so does the call
+    raise first_error
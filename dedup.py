@@ -0,0 +1,82 @@
+import hashlib
+import random
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+
+# Jaccard similarity of character shingles above which two comments count as near-duplicates
+DEFAULT_DUPLICATE_THRESHOLD = 0.6
+SHINGLE_CHARS = 5
+# 16 bands of 2 rows: pairs at the 0.6 threshold become candidates ~99.9% of the time
+NUM_PERMUTATIONS = 32
+LSH_BANDS = 16
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+# Fixed seed so signatures are comparable across indexes and processes
+_rng = random.Random(20250101)
+_PERMUTATIONS: Tuple[Tuple[int, int], ...] = tuple(
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)
+)
+
+
+def shingles(text: str, size: int = SHINGLE_CHARS) -> Set[str]:
+    """Character shingles of the normalized text (case, punctuation and spacing ignored)"""
+    normalized = _SPACES.sub(" ", _NON_WORD.sub("", text.lower())).strip()
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def minhash(shingle_set: Set[str]) -> Tuple[int, ...]:
+    """MinHash signature: the minimum of each permuted shingle hash"""
+    if not shingle_set:
+        return (_MERSENNE_PRIME,) * NUM_PERMUTATIONS
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingle_set]
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def estimated_similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_PERMUTATIONS
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index of comment texts for near-duplicate lookups as comments arrive
+
+    Each added text costs one signature; a lookup only compares against texts
+    sharing an LSH band with it, so checking a feed stays near O(1) per comment.
+    Not thread-safe: meant to be fed from the single thread consuming results.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self.texts: List[str] = []
+        self._signatures: List[Tuple[int, ...]] = []
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+
+    def _bands(self, signature: Tuple[int, ...]):
+        rows = NUM_PERMUTATIONS // LSH_BANDS
+        for band in range(LSH_BANDS):
+            yield band, signature[band * rows:(band + 1) * rows]
+
+    def find_similar(self, text: str) -> Optional[str]:
+        """The most similar indexed text at or above the threshold, if any"""
+        signature = minhash(shingles(text))
+        candidates = {i for band in self._bands(signature) for i in self._buckets.get(band, ())}
+        best, best_score = None, self.threshold
+        for i in candidates:
+            score = estimated_similarity(signature, self._signatures[i])
+            if score >= best_score:
+                best, best_score = self.texts[i], score
+        return best
+
+    def add(self, text: str) -> None:
+        signature = minhash(shingles(text))
+        index = len(self.texts)
+        self.texts.append(text)
+        self._signatures.append(signature)
+        for band in self._bands(signature):
+            self._buckets.setdefault(band, []).append(index)
@@ -0,0 +1,243 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Union
+
+from agents import get_shared_llm
+from cache import content_hash
+from runtime import load_crewai
+
+
+LLM_MODES = ("live", "record", "replay", "synthetic")
+
+Messages = Union[str, List[Dict[str, str]]]
+
+# Short persona-flavored fragments used by the synthetic backend, keyed by words found in the persona
+_SYNTHETIC_VOICES = {
+    "sarcastic": ["Wow, groundbreaking.", "Bold of you to post this.", "I've seen better drafts on napkins."],
+    "encouraging": ["Love this so much!", "You're getting better every post!", "Keep going, this is great!"],
+    "analytical": ["The structure holds up, but the second point lacks evidence.", "Interesting premise; the data is thin."],
+    "provocative": ["Ratio incoming.", "Who asked though?", "This is peak mid content."],
+    "praise": ["THIS IS ART!!!", "Best creator on the internet, no debate.", "Instant classic!!"],
+    "curious": ["Wait, can someone explain the second part?", "New here, what does this mean?"],
+    "expert": ["Small correction: that's not quite how it works in practice.", "Solid take, though the industry moved on from this."],
+    "pidgin": ["Omo, this one na cruise!", "Who send you this work abeg?", "E no easy, but you try small."],
+}
+_GENERIC_VOICE = ["Interesting post.", "Not sure how I feel about this.", "Made me think, honestly."]
+
+
+def normalize_messages(messages: Messages) -> List[Dict[str, str]]:
+    """Accept a bare prompt string or a chat message list"""
+    if isinstance(messages, str):
+        return [{"role": "user", "content": messages}]
+    return [{"role": m.get("role", "user"), "content": str(m.get("content", ""))} for m in messages]
+
+
+def prompt_key(messages: Messages) -> str:
+    """Stable key for a prompt, used to match recorded responses"""
+    parts: List[str] = []
+    for message in normalize_messages(messages):
+        parts.extend([message["role"], message["content"]])
+    return content_hash(*parts)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for usage accounting"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _wants_react_format(messages: List[Dict[str, str]]) -> bool:
+    # CrewAI's executor only accepts answers in its "Final Answer:" format
+    return any("Final Answer:" in m["content"] for m in messages)
+
+
+class _OfflineLLM:
+    """Shared behaviour of the offline backends; combined with CrewAI's BaseLLM at runtime"""
+
+    def __init__(self, model: str, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        super().__init__(model=model)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        # Agent copies made per kickoff share this LLM's holder, so their calls add to the same totals
+        self._usage: Dict[str, int] = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._usage_lock = threading.Lock()
+
+    def call(self, messages: Messages, tools: Optional[List[dict]] = None, callbacks: Optional[List[Any]] = None,
+             available_functions: Optional[Dict[str, Any]] = None, **kwargs) -> str:
+        messages = normalize_messages(messages)
+        response = self._respond(messages)
+        with self._usage_lock:
+            self._usage["calls"] += 1
+            self._usage["prompt_tokens"] += sum(estimate_tokens(m["content"]) for m in messages)
+            self._usage["completion_tokens"] += estimate_tokens(response)
+        return response
+
+    def usage(self) -> Dict[str, int]:
+        """Calls and estimated tokens served since the last reset"""
+        with self._usage_lock:
+            return dict(self._usage)
+
+    def reset_usage(self) -> None:
+        with self._usage_lock:
+            # Cleared in place: copies hold the same dict
+            for name in self._usage:
+                self._usage[name] = 0
+
+    def _respond(self, messages: List[Dict[str, str]]) -> str:
+        raise NotImplementedError
+
+    def _simulate_latency(self) -> None:
+        delay_ms = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def supports_stop_words(self) -> bool:
+        return False
+
+    def get_context_window_size(self) -> int:
+        return 8192
+
+
+class _RecordingLLM(_OfflineLLM):
+    """Forwards every call to a live LLM and appends prompt/response pairs to a JSONL cassette"""
+
+    def __init__(self, inner: Any, cassette_path: str):
+        super().__init__(model=getattr(inner, "model", "recorded"))
+        self.inner = inner
+        self.cassette_path = cassette_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(cassette_path)), exist_ok=True)
+
+    def _respond(self, messages: List[Dict[str, str]]) -> str:
+        response = self.inner.call(messages)
+        record = {"key": prompt_key(messages), "model": self.model, "messages": messages, "response": response}
+        with self._lock, open(self.cassette_path, "a", encoding="utf-8") as cassette:
+            cassette.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return response
+
+
+class _ReplayLLM(_OfflineLLM):
+    """Serves responses from a cassette recorded by the record mode
+
+    Prompts recorded several times are answered in recorded order, cycling
+    when exhausted. Unknown prompts raise KeyError, or fall back to synthetic
+    text when `fallback_to_synthetic` is set.
+    """
+
+    def __init__(self, cassette_path: str, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 fallback_to_synthetic: bool = False):
+        super().__init__(model="replay", latency_ms=latency_ms, jitter_ms=jitter_ms)
+        self.cassette_path = cassette_path
+        self.fallback_to_synthetic = fallback_to_synthetic
+        self._responses: Dict[str, List[str]] = {}
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        with open(cassette_path, encoding="utf-8") as cassette:
+            for line in cassette:
+                if line.strip():
+                    record = json.loads(line)
+                    self._responses.setdefault(record["key"], []).append(record["response"])
+
+    def _respond(self, messages: List[Dict[str, str]]) -> str:
+        key = prompt_key(messages)
+        with self._lock:
+            responses = self._responses.get(key)
+            if responses:
+                position = self._positions.get(key, 0)
+                self._positions[key] = position + 1
+                response = responses[position % len(responses)]
+            else:
+                response = None
+
+        if response is None:
+            if not self.fallback_to_synthetic:
+                raise KeyError(f"No recorded response for prompt {key[:12]} in {self.cassette_path}")
+            response = synthesize_response(messages)
+        self._simulate_latency()
+        return response
+
+
+class _SyntheticLLM(_OfflineLLM):
+    """Generates persona-flavored text locally, with configurable simulated latency"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        super().__init__(model="synthetic", latency_ms=latency_ms, jitter_ms=jitter_ms)
+        self._calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _respond(self, messages: List[Dict[str, str]]) -> str:
+        key = prompt_key(messages)
+        with self._lock:
+            variant = self._calls.get(key, 0)
+            self._calls[key] = variant + 1
+        self._simulate_latency()
+        return synthesize_response(messages, variant)
+
+
+def synthesize_response(messages: List[Dict[str, str]], variant: int = 0) -> str:
+    """Deterministic, persona-flavored stand-in for a model response
+
+    The same prompt and `variant` always produce the same text; repeated
+    calls with the same prompt pass increasing variants.
+    """
+    text = "\n".join(m["content"] for m in messages)
+    lowered = text.lower()
+    rng = random.Random(f"{prompt_key(messages)}:{variant}")
+
+    voice = _GENERIC_VOICE
+    for keyword, lines in _SYNTHETIC_VOICES.items():
+        if keyword in lowered:
+            voice = lines
+            break
+
+    marker = lowered.find("summarize this text")
+    if marker != -1:
+        # Echo the opening of the text being summarized
+        body = " ".join(text[marker:].split(":", 1)[-1].split()[:120])
+    else:
+        batch = re.search(r"JSON array of (?:exactly )?(\d+)", text)
+        if batch:
+            body = json.dumps([f"{rng.choice(voice)} ({i + 1})" for i in range(int(batch.group(1)))])
+        else:
+            body = " ".join(rng.sample(voice, k=min(2, len(voice))))
+
+    if _wants_react_format(messages):
+        return f"Thought: I now can give a great answer\nFinal Answer: {body}"
+    return body
+
+
+@lru_cache(maxsize=None)
+def _crewai_class(backend: type) -> type:
+    """Combine an offline backend with CrewAI's BaseLLM so agents accept it as their llm"""
+    return type(backend.__name__.lstrip("_"), (backend, load_crewai().BaseLLM), {})
+
+
+def create_llm(mode: str, api_key: Optional[str] = None, cassette_path: Optional[str] = None,
+               latency_ms: float = 0.0, jitter_ms: float = 0.0, fallback_to_synthetic: bool = False,
+               inner: Optional[Any] = None):
+    """Build the LLM for a mode: live Groq client, record, replay or synthetic
+
+    Record mode wraps `inner` when given, otherwise the live client for `api_key`.
+    """
+    if mode not in LLM_MODES:
+        raise ValueError(f"Unknown LLM mode '{mode}'. Choose from: {', '.join(LLM_MODES)}")
+    if (mode == "live" or (mode == "record" and inner is None)) and not api_key:
+        raise ValueError(f"LLM mode '{mode}' needs an API key.")
+    if mode in ("record", "replay") and not cassette_path:
+        raise ValueError(f"LLM mode '{mode}' needs a cassette path.")
+
+    if mode == "live":
+        return get_shared_llm(api_key)
+    if mode == "record":
+        return _crewai_class(_RecordingLLM)(inner if inner is not None else get_shared_llm(api_key), cassette_path)
+    if mode == "replay":
+        return _crewai_class(_ReplayLLM)(cassette_path, latency_ms, jitter_ms, fallback_to_synthetic)
+    return _crewai_class(_SyntheticLLM)(latency_ms, jitter_ms)
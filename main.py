@@ -1,6 +1,245 @@
-def main():
-    print("Hello from yapyard!")
+"""Headless batch runner: generate comments for every post in a JSONL or CSV file.
+
+    python main.py posts.jsonl --output results.jsonl --personas "The Critic,The Analyst" --comments 5
+    python main.py posts.csv --output results.jsonl --resume
+    python main.py posts.jsonl --llm-mode synthetic --latency-ms 50
+
+Posts are read one at a time. Each finished post is appended to the output as
+one JSON line and flushed, so the output doubles as the checkpoint: with
+--resume, posts whose id is already in it are skipped.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+os.environ.setdefault("YAPYARD_CACHE_DIR", "./.yapyard_cache")
+
+from agents import AgentRegistry
+from cache import ResultCache, SummaryCache, content_hash
+from comment_engine import ENGINE_BACKENDS, FAILED_COMMENT_TEXT, CommentEngine, create_comment_engine
+from llm_backends import LLM_MODES, create_llm
+from routing import ModelRouter
+
+# Groq on-demand pricing for llama-3.1-8b-instant, USD per million tokens
+DEFAULT_INPUT_PRICE_PER_MTOK = 0.05
+DEFAULT_OUTPUT_PRICE_PER_MTOK = 0.08
+
+# Field names tried, in order, for a post's text and id
+CONTENT_FIELDS = ("content", "text", "post", "body")
+ID_FIELDS = ("id", "post_id")
+# Block size used to find the last complete line of an output file on resume
+OUTPUT_SCAN_BYTES = 64 * 1024
+
+
+def iter_posts(path: str, invalid: Optional[List[int]] = None) -> Iterator[Dict[str, str]]:
+    """Stream `{"id", "content"}` posts from a .jsonl or .csv file
+
+    Posts without an id are keyed by a hash of their content, so resuming
+    still recognizes them. Malformed rows are skipped with a warning and
+    their line numbers appended to `invalid`.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(f)
+            rows: Iterator[Tuple[int, Any]] = ((reader.line_num, row) for row in reader)
+        else:
+            rows = ((number, line) for number, line in enumerate(f, 1) if line.strip())
+        for line_number, row in rows:
+            if isinstance(row, str):
+                try:
+                    row = json.loads(row)
+                except ValueError:
+                    row = None
+            if not isinstance(row, dict):
+                print(f"Skipping line {line_number}: not a JSON object", file=sys.stderr)
+                if invalid is not None:
+                    invalid.append(line_number)
+                continue
+            content = next((str(row[k]) for k in CONTENT_FIELDS if row.get(k)), "")
+            if not content.strip():
+                continue
+            post_id = next((str(row[k]) for k in ID_FIELDS if row.get(k) not in (None, "")), None)
+            yield {"id": post_id or content_hash(content)[:16], "content": content}
+
+
+def completed_ids(path: str) -> Set[str]:
+    """Ids already written to an output file; a line cut short by a crash is ignored"""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError, TypeError):
+                continue
+    return done
+
+
+def open_output(path: str, resume: bool):
+    """Open the output for appending (resume) or writing, dropping a truncated last line"""
+    if not resume or not os.path.exists(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return open(path, "w", encoding="utf-8")
+    with open(path, "r+b") as f:
+        # Cut the file back to just after its last newline; that post was never checkpointed
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            step = min(OUTPUT_SCAN_BYTES, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b"\n")
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position != end:
+            f.truncate(position)
+    return open(path, "a", encoding="utf-8")
+
+
+def generate_for_post(engine: CommentEngine, post: Dict[str, str], personas: List[str], args,
+                      cancel: Optional[threading.Event] = None) -> Dict:
+    """Generate one post's comments; the record written to the output"""
+    started = time.perf_counter()
+    comments = engine.generate_comments(post["content"], personas, args.comments,
+                                        batched=args.batched, fresh=not args.reuse_cached, cancel=cancel)
+    return {
+        "id": post["id"],
+        "content_hash": content_hash(post["content"]),
+        "comments": comments,
+        "failed": sum(1 for c in comments if c["text"] == FAILED_COMMENT_TEXT),
+        "wall_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def build_engine(args) -> CommentEngine:
+    """Engine for the requested LLM mode; live and record modes need an API key"""
+    api_key = args.api_key or os.environ.get("GROQ_API_KEY")
+    llm = None
+    if args.llm_mode != "live":
+        llm = create_llm(args.llm_mode, api_key=api_key, cassette_path=args.cassette,
+                         latency_ms=args.latency_ms, fallback_to_synthetic=args.llm_mode == "replay")
+    elif not api_key:
+        raise SystemExit("Live mode needs an API key: pass --api-key or set GROQ_API_KEY.")
+
+    cache_dir = os.environ["YAPYARD_CACHE_DIR"]
+    return create_comment_engine(
+        AgentRegistry(api_key=api_key, llm=llm),
+        backend=args.backend,
+        max_concurrency=args.concurrency,
+        summary_cache=SummaryCache(path=os.path.join(cache_dir, "summaries.sqlite")),
+        result_cache=ResultCache(path=os.path.join(cache_dir, "results.sqlite")),
+        router=ModelRouter.load(args.routes) if args.routes else None,
+    )
+
+
+def print_summary(engine: CommentEngine, written: int, comments: int, failed: int, skipped: int, invalid: int,
+                  elapsed: float, args) -> None:
+    usage = engine.metrics.summary()
+    cost = (usage["prompt_tokens"] * args.input_price + usage["completion_tokens"] * args.output_price) / 1_000_000
+    elapsed = max(elapsed, 1e-9)
+    print(f"Posts written:   {written} ({skipped} skipped from checkpoint, {invalid} malformed rows skipped)",
+          file=sys.stderr)
+    print(f"Comments:        {comments} ({failed} failed)", file=sys.stderr)
+    print(f"Elapsed:         {elapsed:.1f} s", file=sys.stderr)
+    print(f"Throughput:      {written / elapsed:.2f} posts/s, {comments / elapsed:.2f} comments/s", file=sys.stderr)
+    print(f"LLM calls:       {usage['calls']} ({usage['cache_hits']} cache hits, {usage['retries']} retries)",
+          file=sys.stderr)
+    print(f"Tokens:          {usage['prompt_tokens']} prompt, {usage['completion_tokens']} completion "
+          f"({usage['tokens_saved']} prompt tokens saved by budgeting)", file=sys.stderr)
+    print(f"Estimated cost:  ${cost:.4f}", file=sys.stderr)
+
+
+def run(args) -> int:
+    engine = build_engine(args)
+    names = engine.agent_registry.get_agent_names()
+    personas = [p.strip() for p in args.personas.split(",") if p.strip()] if args.personas else names
+    unknown = [p for p in personas if p not in names]
+    if unknown:
+        raise SystemExit(f"Unknown personas: {', '.join(unknown)}. Available: {', '.join(names)}")
+
+    done = completed_ids(args.output) if args.resume else set()
+    written = comments = failed = skipped = errors = 0
+    invalid: List[int] = []
+    started = time.perf_counter()
+    in_flight: Dict[Future, Dict[str, str]] = {}
+    # Set on Ctrl-C: in-flight posts stop waiting on the model instead of finishing unused
+    stop = threading.Event()
+
+    def drain(futures) -> None:
+        nonlocal written, comments, failed, errors
+        for future in futures:
+            post = in_flight.pop(future)
+            try:
+                record = future.result()
+            except Exception as e:
+                # Not checkpointed, so a resumed run retries it
+                errors += 1
+                print(f"Post {post['id']} failed: {e}", file=sys.stderr)
+                continue
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            written += 1
+            comments += len(record["comments"])
+            failed += record["failed"]
+
+    output = open_output(args.output, args.resume)
+    pool = ThreadPoolExecutor(max_workers=args.parallel_posts, thread_name_prefix="yapyard-post")
+    try:
+        for post in iter_posts(args.input, invalid):
+            if post["id"] in done:
+                skipped += 1
+                continue
+            done.add(post["id"])
+            # Keep a bounded window of posts in flight instead of queueing the whole file
+            while len(in_flight) >= args.parallel_posts:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                drain(finished)
+            in_flight[pool.submit(generate_for_post, engine, post, personas, args, stop)] = post
+        drain(wait(in_flight).done)
+    except KeyboardInterrupt:
+        print("Interrupted; finished posts are checkpointed, rerun with --resume to continue.", file=sys.stderr)
+        stop.set()
+        return 130
+    finally:
+        # Cancelled posts return within a poll interval, so joining the workers is quick
+        pool.shutdown(wait=True, cancel_futures=True)
+        output.close()
+        print_summary(engine, written, comments, failed, skipped, len(invalid), time.perf_counter() - started, args)
+    return 1 if errors else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="Posts as .jsonl or .csv, with a content/text column and an optional id")
+    parser.add_argument("--output", default="yapyard_results.jsonl")
+    parser.add_argument("--resume", action="store_true", help="Skip posts already in the output and append to it")
+    parser.add_argument("--personas", help="Comma-separated persona names (default: all)")
+    parser.add_argument("--comments", type=int, default=5, help="Comments per post")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel model calls per post")
+    parser.add_argument("--parallel-posts", type=int, default=2, help="Posts processed at the same time")
+    parser.add_argument("--batched", action="store_true", help="One request per persona per post")
+    parser.add_argument("--reuse-cached", action="store_true", help="Serve comments cached by earlier runs; only runs with this flag fill the cache")
+    parser.add_argument("--backend", choices=sorted(ENGINE_BACKENDS), default=os.environ.get("YAPYARD_ENGINE", "crew"))
+    parser.add_argument("--llm-mode", choices=LLM_MODES, default="live")
+    parser.add_argument("--api-key", help="Groq API key (default: GROQ_API_KEY)")
+    parser.add_argument("--routes", help="Model routing file (default: YAPYARD_MODEL_ROUTES or one model for everything)")
+    parser.add_argument("--cassette", help="Cassette path for the record and replay modes")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated latency for offline modes")
+    parser.add_argument("--input-price", type=float, default=DEFAULT_INPUT_PRICE_PER_MTOK, help="USD per 1M prompt tokens")
+    parser.add_argument("--output-price", type=float, default=DEFAULT_OUTPUT_PRICE_PER_MTOK,
+                        help="USD per 1M completion tokens")
+    args = parser.parse_args()
+    args.parallel_posts = max(1, args.parallel_posts)
+    return run(args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,176 @@
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Deque, Dict, List, Optional
+
+
+@dataclass
+class CallRecord:
+    """One LLM call (or cache hit standing in for one)"""
+    stage: str  # "summary", "comment", "batch" or "reply"
+    persona: str
+    model: str = ""
+    wall_ms: float = 0.0
+    queue_wait_ms: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    measured_prompt_tokens: int = 0  # prompt size counted locally before sending
+    tokens_saved: int = 0  # prompt tokens the content budget cut (summarized or trimmed content)
+    retries: int = 0
+    hedged: bool = False  # a duplicate request was fired because this call ran slow
+    rejected: bool = False  # the output failed validation (and escalated if its route had another model)
+    cache_hit: bool = False
+    failure: Optional[str] = None  # exception class name when the call failed
+    timestamp: float = field(default_factory=time.time)
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class MetricsCollector:
+    """Thread-safe aggregate of call records
+
+    Totals cover every record ever seen; latency percentiles use the most
+    recent `max_records`. Records are forwarded to `parent`, so a session
+    collector can feed the process-wide one.
+    """
+
+    def __init__(self, max_records: int = 1000, parent: Optional["MetricsCollector"] = None):
+        self.parent = parent
+        self._recent: Deque[CallRecord] = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._recent.clear()
+            self.calls = 0
+            self.cache_hits = 0
+            self.retries = 0
+            self.hedges = 0
+            self.rejections = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.tokens_saved = 0
+            self.failures: Dict[str, int] = {}
+            self.by_persona: Dict[str, Dict[str, float]] = {}
+            self.by_stage: Dict[str, int] = {}
+            self.by_model: Dict[str, Dict[str, float]] = {}
+
+    def record(self, record: CallRecord) -> None:
+        with self._lock:
+            self._recent.append(record)
+            self.by_stage[record.stage] = self.by_stage.get(record.stage, 0) + 1
+            persona = self.by_persona.setdefault(record.persona, {"calls": 0, "cache_hits": 0, "failures": 0, "wall_ms": 0.0})
+            if record.cache_hit:
+                self.cache_hits += 1
+                persona["cache_hits"] += 1
+            else:
+                self.calls += 1
+                self.retries += record.retries
+                self.hedges += record.hedged
+                self.rejections += record.rejected
+                self.prompt_tokens += record.prompt_tokens
+                self.completion_tokens += record.completion_tokens
+                self.tokens_saved += record.tokens_saved
+                persona["calls"] += 1
+                persona["wall_ms"] += record.wall_ms
+                model = self.by_model.setdefault(record.model, {"calls": 0, "rejected": 0, "wall_ms": 0.0,
+                                                                "prompt_tokens": 0, "completion_tokens": 0})
+                model["calls"] += 1
+                model["rejected"] += record.rejected
+                model["wall_ms"] += record.wall_ms
+                model["prompt_tokens"] += record.prompt_tokens
+                model["completion_tokens"] += record.completion_tokens
+            if record.failure:
+                self.failures[record.failure] = self.failures.get(record.failure, 0) + 1
+                persona["failures"] += 1
+        if self.parent is not None:
+            self.parent.record(record)
+
+    def summary(self) -> Dict:
+        """Aggregated view used by the stats panel and the exporters"""
+        with self._lock:
+            walls = [r.wall_ms for r in self._recent if not r.cache_hit]
+            waits = [r.queue_wait_ms for r in self._recent if not r.cache_hit]
+            return {
+                "calls": self.calls,
+                "cache_hits": self.cache_hits,
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "rejections": self.rejections,
+                "failures": dict(self.failures),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "tokens_saved": self.tokens_saved,
+                "wall_ms_p50": _percentile(walls, 0.5),
+                "wall_ms_p95": _percentile(walls, 0.95),
+                "queue_wait_ms_p95": _percentile(waits, 0.95),
+                "by_stage": dict(self.by_stage),
+                "by_persona": {name: dict(stats) for name, stats in self.by_persona.items()},
+                "by_model": {name: dict(stats) for name, stats in self.by_model.items()},
+            }
+
+    def latency_percentile(self, fraction: float, min_samples: int = 1) -> Optional[float]:
+        """Recent model-call wall time percentile in ms; None with fewer than `min_samples` calls"""
+        with self._lock:
+            walls = [r.wall_ms for r in self._recent if not r.cache_hit and not r.failure]
+        return _percentile(walls, fraction) if len(walls) >= min_samples else None
+
+    def to_json(self, include_records: bool = True) -> str:
+        """Summary (and recent records) as a JSON document"""
+        payload = {"summary": self.summary()}
+        if include_records:
+            with self._lock:
+                payload["records"] = [asdict(r) for r in self._recent]
+        return json.dumps(payload, indent=2)
+
+    def to_prometheus(self, prefix: str = "yapyard") -> str:
+        """Summary in the Prometheus text exposition format"""
+        stats = self.summary()
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[tuple]) -> None:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"{prefix}_{name}{{{label_text}}} {value}" if label_text else f"{prefix}_{name} {value}")
+
+        metric("llm_calls_total", "counter", "LLM calls made", [({}, stats["calls"])])
+        metric("cache_hits_total", "counter", "Calls served from cache", [({}, stats["cache_hits"])])
+        metric("llm_retries_total", "counter", "LLM call retries", [({}, stats["retries"])])
+        metric("llm_hedges_total", "counter", "Slow LLM calls that fired a hedged duplicate", [({}, stats["hedges"])])
+        metric("llm_rejections_total", "counter", "LLM outputs that failed validation",
+               [({}, stats["rejections"])])
+        metric("llm_failures_total", "counter", "Failed LLM calls by exception class",
+               [({"failure": name}, count) for name, count in sorted(stats["failures"].items())])
+        metric("llm_tokens_total", "counter", "Tokens sent and received",
+               [({"kind": "prompt"}, stats["prompt_tokens"]), ({"kind": "completion"}, stats["completion_tokens"])])
+        metric("prompt_tokens_saved_total", "counter", "Prompt tokens cut by content budgeting",
+               [({}, stats["tokens_saved"])])
+        metric("llm_wall_ms", "gauge", "Recent LLM call wall time percentiles",
+               [({"quantile": "0.5"}, round(stats["wall_ms_p50"], 3)), ({"quantile": "0.95"}, round(stats["wall_ms_p95"], 3))])
+        metric("llm_queue_wait_ms", "gauge", "Recent queue wait 95th percentile",
+               [({"quantile": "0.95"}, round(stats["queue_wait_ms_p95"], 3))])
+        metric("persona_calls_total", "counter", "LLM calls per persona",
+               [({"persona": name}, persona["calls"]) for name, persona in sorted(stats["by_persona"].items())])
+        metric("model_calls_total", "counter", "LLM calls per model",
+               [({"model": name}, model["calls"]) for name, model in sorted(stats["by_model"].items())])
+        metric("model_rejections_total", "counter", "LLM outputs per model that failed validation",
+               [({"model": name}, model["rejected"]) for name, model in sorted(stats["by_model"].items())])
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Aggregate over every session in this process
+PROCESS_METRICS = MetricsCollector(max_records=5000)
@@ -0,0 +1,91 @@
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+
+# Persona catalog shipped with YapYard; point YAPYARD_PERSONAS at another file to replace it
+DEFAULT_PERSONAS_PATH = os.environ.get(
+    "YAPYARD_PERSONAS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "personas.json")
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Persona:
+    """Everything needed to build a commenter Agent, without building it"""
+    name: str
+    role: str
+    goal: str
+    backstory: str
+    tags: Tuple[str, ...]
+
+
+class PersonaStore(Mapping):
+    """Name-indexed persona catalog with a tag index
+
+    Lookups by name (exact or case-insensitive) and by tag are dict hits, so
+    they stay O(1) however many personas are loaded. Iteration follows
+    insertion order; adding a persona under an existing name replaces it.
+    """
+
+    def __init__(self, personas: Iterable[Persona] = ()):
+        self._by_name: Dict[str, Persona] = {}
+        self._by_folded_name: Dict[str, str] = {}
+        self._by_tag: Dict[str, Dict[str, None]] = {}
+        for persona in personas:
+            self.add(persona)
+
+    @classmethod
+    def load(cls, path: str) -> "PersonaStore":
+        """Read a catalog file: {"personas": [{"name", "role", "goal", "backstory", "tags"}]}"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            Persona(entry["name"], entry["role"], entry["goal"], entry["backstory"], tuple(entry.get("tags", ())))
+            for entry in data["personas"]
+        )
+
+    def add(self, persona: Persona) -> None:
+        if persona.name in self._by_name:
+            self._unindex_tags(self._by_name[persona.name])
+        self._by_name[persona.name] = persona
+        self._by_folded_name[persona.name.casefold()] = persona.name
+        for tag in persona.tags:
+            self._by_tag.setdefault(tag.casefold(), {})[persona.name] = None
+
+    def _unindex_tags(self, persona: Persona) -> None:
+        for tag in persona.tags:
+            names = self._by_tag.get(tag.casefold())
+            if names is not None:
+                names.pop(persona.name, None)
+
+    def find(self, name: str) -> Optional[Persona]:
+        """Case-insensitive lookup by name"""
+        canonical = self._by_folded_name.get(name.strip().casefold())
+        return self._by_name[canonical] if canonical is not None else None
+
+    def names_with_tag(self, tag: str) -> List[str]:
+        """Persona names carrying `tag`, in catalog order"""
+        return list(self._by_tag.get(tag.casefold(), ()))
+
+    def tags(self) -> List[str]:
+        return sorted(tag for tag, names in self._by_tag.items() if names)
+
+    def __getitem__(self, name: str) -> Persona:
+        return self._by_name[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._by_name
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._by_name)
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+
+@lru_cache(maxsize=None)
+def load_default_personas(path: str = DEFAULT_PERSONAS_PATH) -> PersonaStore:
+    """The default persona catalog, read once per process"""
+    return PersonaStore.load(path)
@@ -0,0 +1,116 @@
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from cache import content_hash
+from comment_engine import CommentEngine
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds the content must stay unchanged before speculative work starts
+DEFAULT_DEBOUNCE_SECONDS = 1.5
+# Comments generated ahead of the click; the rest are generated on demand
+DEFAULT_PREWARM_COMMENTS = 2
+
+
+class _Speculation:
+    """One background run for one exact request"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.cancelled = threading.Event()
+        self.comments: Dict[int, Dict] = {}
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+
+class Prewarmer:
+    """Speculatively prepares content and the first comments while the creator is still editing
+
+    `schedule` is called with the current request on every rerun. After the
+    request has been stable for `debounce_seconds`, a background thread
+    summarizes the content (warming the summary cache) and generates up to
+    `max_comments` comments. Work is keyed to the exact content, personas
+    and settings: a different request cancels the running one. `take`
+    hands over whatever finished for a matching request and stops the rest.
+    """
+
+    def __init__(self, engine: CommentEngine, debounce_seconds: float = DEFAULT_DEBOUNCE_SECONDS,
+                 max_comments: int = DEFAULT_PREWARM_COMMENTS):
+        self.engine = engine
+        self.debounce_seconds = debounce_seconds
+        self.max_comments = max(0, max_comments)
+        self._current: Optional[_Speculation] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def request_key(content: str, selected_agents: List[str], num_comments: int, batched: bool, fresh: bool) -> str:
+        return content_hash(content, *selected_agents, str(num_comments), str(batched), str(fresh))
+
+    def schedule(self, content: str, selected_agents: List[str], num_comments: int,
+                 batched: bool = False, fresh: bool = False) -> None:
+        """Start (after the debounce) speculative work for this request, cancelling any other"""
+        key = self.request_key(content, selected_agents, num_comments, batched, fresh)
+        with self._lock:
+            if self._current is not None and self._current.key == key:
+                return
+            self._cancel_locked()
+            speculation = self._current = _Speculation(key)
+        speculation.thread = threading.Thread(
+            target=self._run, args=(speculation, content, list(selected_agents), num_comments, batched, fresh),
+            name="yapyard-prewarm", daemon=True
+        )
+        speculation.thread.start()
+
+    def _run(self, speculation: _Speculation, content: str, selected_agents: List[str],
+             num_comments: int, batched: bool, fresh: bool) -> None:
+        # Debounce: a newer request within the window cancels this one before any call goes out
+        if speculation.cancelled.wait(self.debounce_seconds):
+            return
+        try:
+            self.engine._set_request_scope(None, speculation.cancelled)
+            try:
+                self.engine._prepare_content(content)
+            finally:
+                self.engine._set_request_scope(None, None)
+            if not self.max_comments or speculation.cancelled.is_set():
+                return
+            # Same arguments as the real request, so the planned slots line up with it
+            # The cancel event also abandons calls in flight, so they never overlap the real request
+            stream = self.engine.iter_comments(content, selected_agents, num_comments, batched=batched, fresh=fresh,
+                                               only_slots=list(range(min(self.max_comments, num_comments))),
+                                               cancel=speculation.cancelled)
+            try:
+                for slot, comment in stream:
+                    if speculation.cancelled.is_set():
+                        break
+                    with speculation.lock:
+                        speculation.comments[slot] = comment
+            finally:
+                # Cancels the requests that have not started
+                stream.close()
+        except Exception:
+            # Speculative work never surfaces errors; the real request will retry
+            logger.warning("Prewarm failed", exc_info=True)
+
+    def take(self, content: str, selected_agents: List[str], num_comments: int,
+             batched: bool = False, fresh: bool = False) -> Dict[int, Dict]:
+        """Comments pre-generated for exactly this request, by slot; stops the background run"""
+        key = self.request_key(content, selected_agents, num_comments, batched, fresh)
+        with self._lock:
+            speculation = self._current
+            self._cancel_locked()
+        if speculation is None or speculation.key != key:
+            return {}
+        with speculation.lock:
+            return dict(speculation.comments)
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancel_locked()
+
+    def _cancel_locked(self) -> None:
+        if self._current is not None:
+            self._current.cancelled.set()
+            self._current = None
@@ -0,0 +1,100 @@
+import re
+from typing import Optional
+
+from routing import DEFAULT_MODEL
+from runtime import load_tokenizer
+
+
+# Context windows of the models YapYard routes to; unknown models get the conservative default
+MODEL_CONTEXT_TOKENS = {
+    "groq/llama-3.1-8b-instant": 131072,
+    "groq/llama-3.3-70b-versatile": 131072,
+    "groq/gemma2-9b-it": 8192,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+
+# Content carried verbatim by a comment prompt (about the 800 characters used before)
+DEFAULT_CONTENT_TOKENS = 200
+# Content at most this share over budget is trimmed: a summarizer call would cost more than it keeps
+TRUNCATE_SLACK = 0.1
+# Largest share of the context window a single summarizer prompt may fill
+SUMMARY_CONTEXT_SHARE = 0.5
+
+PASS_THROUGH = "pass"
+TRUNCATE = "truncate"
+SUMMARIZE = "summarize"
+
+_PIECES = re.compile(r"\w+|[^\w\s]|\s{2,}")
+_LINE_INDENT = re.compile(r"^[ \t]+|[ \t]+$", re.MULTILINE)
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in `text`: tiktoken's cl100k_base when available, else a word-based estimate"""
+    if not text:
+        return 0
+    encoding = load_tokenizer()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Words cost a token plus one per 6 further characters; punctuation and whitespace runs one each
+    return sum(1 + (len(piece) - 1) // 6 if piece[0].isalnum() or piece[0] == "_" else 1
+               for piece in _PIECES.findall(text))
+
+
+def compact_prompt(template: str) -> str:
+    """Strip a prompt template's indentation and surplus blank lines
+
+    Meant for templates before content is formatted in, so the creator's own
+    whitespace is left alone.
+    """
+    return _BLANK_LINES.sub("\n\n", _LINE_INDENT.sub("", template)).strip()
+
+
+def truncate_to_tokens(text: str, max_tokens: int, placeholder: str = "... [truncated]") -> str:
+    """Cut `text` on a word boundary so it fits in `max_tokens`, placeholder included"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    budget = max(0, max_tokens - count_tokens(placeholder))
+    words = text.split()
+    # Binary search on the number of leading words that still fit
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]).rstrip(",;:") + placeholder
+
+
+class PromptBudget:
+    """Token budget for the content a prompt carries on one model
+
+    `plan` picks what to do with content: pass it through when it fits,
+    trim it when it is only slightly over, summarize it otherwise. Content
+    too long for one summarizer prompt on this model is summarized in chunks.
+    """
+
+    def __init__(self, model: Optional[str] = None, content_tokens: int = DEFAULT_CONTENT_TOKENS,
+                 truncate_slack: float = TRUNCATE_SLACK):
+        self.model = model or DEFAULT_MODEL
+        self.context_tokens = MODEL_CONTEXT_TOKENS.get(self.model, DEFAULT_CONTEXT_TOKENS)
+        self.content_tokens = max(1, min(content_tokens, self.context_tokens // 8))
+        self.truncate_slack = max(0.0, truncate_slack)
+        self.summary_tokens = int(self.context_tokens * SUMMARY_CONTEXT_SHARE)
+
+    def plan(self, tokens: int, max_tokens: Optional[int] = None) -> str:
+        """PASS_THROUGH, TRUNCATE or SUMMARIZE for content of `tokens` against the budget"""
+        limit = self.limit(max_tokens)
+        if tokens <= limit:
+            return PASS_THROUGH
+        if tokens <= limit * (1 + self.truncate_slack):
+            return TRUNCATE
+        return SUMMARIZE
+
+    def limit(self, max_tokens: Optional[int] = None) -> int:
+        return self.content_tokens if max_tokens is None else min(max_tokens, self.content_tokens)
+
+    def fits_one_summary(self, tokens: int) -> bool:
+        """Whether content this long can be summarized in a single call on this model"""
+        return tokens <= self.summary_tokens
@@ -0,0 +1,210 @@
+import os
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from cache import content_hash
+from deadlines import CallTimeout, check_call
+
+
+T = TypeVar("T")
+
+# Groq's published limits for llama-3.1-8b-instant on the free tier; override per deployment
+DEFAULT_REQUESTS_PER_MINUTE = float(os.environ.get("YAPYARD_RPM", "30"))
+DEFAULT_TOKENS_PER_MINUTE = float(os.environ.get("YAPYARD_TPM", "6000"))
+
+_RETRY_IN_PATTERN = re.compile(r"try again in ([\d.]+)\s*(ms|s)", re.IGNORECASE)
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`
+
+    `reserve` always succeeds and returns how long the caller must wait before
+    using what it reserved, so concurrent callers are served in order.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` from the bucket and return the wait in seconds"""
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.rate_per_second)
+            self._updated = now
+            self._level -= min(amount, self.capacity)
+            return 0.0 if self._level >= 0 else -self._level / self.rate_per_second
+
+    def adjust(self, amount: float) -> None:
+        """Correct an earlier reservation once the real cost is known (negative refunds)"""
+        with self._lock:
+            self._level = min(self.capacity, self._level - amount)
+
+
+class AdaptiveConcurrency:
+    """AIMD controller for the number of in-flight calls
+
+    Every success grows the limit by 1/limit (about +1 per round-trip window);
+    a rate-limit error halves it, and a call much slower than the running
+    latency baseline shrinks it slightly.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16, slow_factor: float = 2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.slow_factor = slow_factor
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._baseline_ms: Optional[float] = None
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return max(self.minimum, int(self._limit))
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency_ms: float) -> None:
+        with self._condition:
+            if self._baseline_ms is None:
+                self._baseline_ms = latency_ms
+            slow = latency_ms > self._baseline_ms * self.slow_factor
+            self._baseline_ms = 0.9 * self._baseline_ms + 0.1 * latency_ms
+            if slow:
+                self._limit = max(self.minimum, self._limit * 0.9)
+            else:
+                self._limit = min(self.maximum, self._limit + 1.0 / self._limit)
+            self._condition.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._condition:
+            self._limit = max(self.minimum, self._limit / 2)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for HTTP 429 / provider rate-limit errors (litellm, groq, CrewAI-wrapped)"""
+    if getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError":
+        return True
+    message = str(error).lower()
+    return "rate limit" in message or "rate_limit" in message or "429" in message
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Server-suggested wait from a Retry-After header or a 'try again in Xs' message"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+    match = _RETRY_IN_PATTERN.search(str(error))
+    if match:
+        amount = float(match.group(1))
+        return amount / 1000 if match.group(2).lower() == "ms" else amount
+    return None
+
+
+class RateLimiter:
+    """Requests/min and tokens/min buckets, adaptive concurrency and 429-aware retries for one API key"""
+
+    def __init__(self, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+                 max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0,
+                 concurrency: Optional[AdaptiveConcurrency] = None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.concurrency = concurrency if concurrency is not None else AdaptiveConcurrency()
+        self.throttled = 0
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Retry-After when the server gives one, else exponential backoff with full jitter"""
+        suggested = retry_after_seconds(error)
+        if suggested is not None:
+            return min(self.max_delay, suggested) + random.uniform(0, self.base_delay / 4)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn: Callable[[], T], estimated_tokens: int = 0,
+             actual_tokens: Optional[Callable[[T], int]] = None,
+             cancel: Optional[threading.Event] = None, expires_at: Optional[float] = None) -> Tuple[T, int]:
+        """Run `fn` under the limits; returns its result and the number of retries it took
+
+        Waits for the buckets and retry backoffs end early when `cancel` is set
+        or would run past `expires_at` (a `time.monotonic()` value), and `fn` is
+        never started once either happened.
+        """
+        for attempt in range(self.max_retries + 1):
+            delay = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+            try:
+                self._wait(delay, cancel, expires_at)
+                self.concurrency.acquire()
+            except Exception:
+                # The call is not sent, so its reservation goes back to the buckets
+                self.requests.adjust(-1)
+                self.tokens.adjust(-estimated_tokens)
+                raise
+            started = time.perf_counter()
+            try:
+                check_call(cancel, expires_at)
+                result = fn()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self.throttled += 1
+                self.concurrency.on_throttle()
+                delay = self.backoff(attempt, e)
+            else:
+                self.concurrency.on_success((time.perf_counter() - started) * 1000)
+                if actual_tokens is not None:
+                    self.tokens.adjust(actual_tokens(result) - estimated_tokens)
+                return result, attempt
+            finally:
+                self.concurrency.release()
+            self._wait(delay, cancel, expires_at)
+        raise RuntimeError("unreachable")
+
+    @staticmethod
+    def _wait(delay: float, cancel: Optional[threading.Event], expires_at: Optional[float]) -> None:
+        """Sleep `delay` seconds unless cancelled; give up at once if the wait outlasts `expires_at`"""
+        check_call(cancel, expires_at)
+        if delay <= 0:
+            return
+        if expires_at is not None and time.monotonic() + delay >= expires_at:
+            raise CallTimeout(f"Rate limit wait of {delay:.1f}s outlasts the call's time budget")
+        if cancel is not None:
+            cancel.wait(delay)
+        else:
+            time.sleep(delay)
+        check_call(cancel, expires_at)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key: str) -> RateLimiter:
+    """Process-wide limiter for an API key, shared by every session using it"""
+    key = content_hash(api_key)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter()
+        return _limiters[key]
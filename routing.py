@@ -0,0 +1,78 @@
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Mapping, Optional, Sequence, Tuple, Union
+
+
+# Model every stage uses unless a route says otherwise
+DEFAULT_MODEL = "groq/llama-3.1-8b-instant"
+
+# Routing file replacing the single-model default; see ModelRouter.load for its format
+DEFAULT_ROUTES_PATH = os.environ.get("YAPYARD_MODEL_ROUTES", "")
+
+# Stages with their own route; the others follow the stage they are a variant of
+STAGES = ("summary", "comment", "reply")
+STAGE_ALIASES = {"batch": "comment", "regenerate": "comment"}
+
+Route = Tuple[str, ...]
+
+
+def _route(models: Union[str, Sequence[str]]) -> Route:
+    route = (models,) if isinstance(models, str) else tuple(models)
+    if not route or not all(isinstance(model, str) and model for model in route):
+        raise ValueError(f"A route must be a model name or a non-empty list of model names, got {models!r}")
+    return route
+
+
+class ModelRouter:
+    """Picks the models each call runs on, per stage and per persona
+
+    A route is a cascade: models in order, cheapest/fastest first. A call
+    runs on the first model and only escalates to the next when its output
+    fails the stage's validation, so the stronger models are paid for only
+    on the outputs that need them. Lookups go persona+stage, persona, stage,
+    then the default route.
+    """
+
+    def __init__(self, default: Union[str, Sequence[str]] = DEFAULT_MODEL,
+                 stages: Optional[Mapping[str, Union[str, Sequence[str]]]] = None,
+                 personas: Optional[Mapping[str, Union[str, Sequence[str], Mapping[str, Union[str, Sequence[str]]]]]] = None):
+        self.default = _route(default)
+        self.stages: Dict[str, Route] = {}
+        self.personas: Dict[Tuple[str, Optional[str]], Route] = {}
+        for stage, models in (stages or {}).items():
+            self.stages[self._check_stage(stage)] = _route(models)
+        for persona, routes in (personas or {}).items():
+            if isinstance(routes, Mapping):
+                for stage, models in routes.items():
+                    self.personas[(persona, self._check_stage(stage))] = _route(models)
+            else:
+                self.personas[(persona, None)] = _route(routes)
+
+    @staticmethod
+    def _check_stage(stage: str) -> str:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage '{stage}'. Choose from: {', '.join(STAGES)}")
+        return stage
+
+    @classmethod
+    def load(cls, path: str) -> "ModelRouter":
+        """Read a routing file: {"default": [...], "stages": {stage: [...]}, "personas": {name: [...] or {stage: [...]}}}"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("default", DEFAULT_MODEL), data.get("stages"), data.get("personas"))
+
+    def models_for(self, stage: str, persona: Optional[str] = None) -> Route:
+        """The cascade for one call, first model first"""
+        stage = STAGE_ALIASES.get(stage, stage)
+        if persona is not None:
+            route = self.personas.get((persona, stage)) or self.personas.get((persona, None))
+            if route is not None:
+                return route
+        return self.stages.get(stage, self.default)
+
+
+@lru_cache(maxsize=None)
+def load_default_router(path: str = DEFAULT_ROUTES_PATH) -> ModelRouter:
+    """The process-wide router: the routing file when one is configured, else every stage on DEFAULT_MODEL"""
+    return ModelRouter.load(path) if path else ModelRouter()
@@ -0,0 +1,117 @@
+import hashlib
+import importlib.util
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Chroma refuses to import on SQLite older than this
+CHROMA_MIN_SQLITE = (3, 35, 0)
+
+# tiktoken caches BPE files under the SHA-1 of their URL
+CL100K_BASE_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+
+_crewai = None
+_litellm = None
+_tokenizer = None
+_tokenizer_loaded = False
+_lock = threading.Lock()
+
+
+def ensure_vector_store_support() -> None:
+    """Prepare the environment for Chroma, which CrewAI's memory/RAG storage imports
+
+    The bundled pysqlite3 is only swapped in when the system SQLite is too old
+    for Chroma, so hosts with a modern SQLite never load it.
+    """
+    # Set these BEFORE chromadb/crewai import (can also be set as Streamlit env vars)
+    os.environ.setdefault("CHROMA_DB_IMPL", "duckdb+parquet")
+    os.environ.setdefault("CREWAI_STORAGE_DIR", "./.crewai_storage")
+
+    if sqlite3.sqlite_version_info >= CHROMA_MIN_SQLITE or "pysqlite3" in sys.modules:
+        return
+    try:
+        import pysqlite3 as pysqlite3_mod  # installed from pysqlite3-binary
+        sys.modules['sqlite3'] = pysqlite3_mod
+    except Exception as e:
+        # if this fails, keep going so we can see the original error in logs
+        print("pysqlite3 import/override failed:", e)
+
+
+def load_crewai():
+    """Import CrewAI (and with it chromadb/litellm) on first use and return the module"""
+    global _crewai
+    if _crewai is None:
+        with _lock:
+            if _crewai is None:
+                ensure_vector_store_support()
+                import crewai
+                _crewai = crewai
+    return _crewai
+
+
+def load_litellm():
+    """Import litellm on first use and return the module"""
+    global _litellm
+    if _litellm is None:
+        with _lock:
+            if _litellm is None:
+                import litellm
+                _litellm = litellm
+    return _litellm
+
+
+def _tiktoken_cache_dir() -> Optional[str]:
+    """Directory holding tiktoken's BPE files: TIKTOKEN_CACHE_DIR, else the copies bundled with litellm"""
+    configured = os.environ.get("TIKTOKEN_CACHE_DIR")
+    if configured:
+        return configured
+    spec = importlib.util.find_spec("litellm")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    # Located without importing litellm, which is far too heavy for the first token count
+    for location in spec.submodule_search_locations:
+        for relative in (("litellm_core_utils", "tokenizers"), ("llms", "tokenizers")):
+            candidate = os.path.join(location, *relative)
+            if os.path.isdir(candidate):
+                return candidate
+    return None
+
+
+def load_tokenizer():
+    """tiktoken's cl100k_base encoding on first use; None when tiktoken or a local copy of its BPE file is missing
+
+    The encoding is only ever read from a local cache (litellm ships one), never
+    downloaded, so offline modes and firewalled hosts make no network calls.
+    """
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        with _lock:
+            if not _tokenizer_loaded:
+                _tokenizer = _load_local_tokenizer()
+                _tokenizer_loaded = True
+    return _tokenizer
+
+
+def _load_local_tokenizer():
+    try:
+        import tiktoken
+    except ImportError:
+        logger.info("tiktoken is not installed; estimating token counts")
+        return None
+    cache_dir = _tiktoken_cache_dir()
+    cached_file = hashlib.sha1(CL100K_BASE_URL.encode()).hexdigest()
+    if cache_dir is None or not os.path.exists(os.path.join(cache_dir, cached_file)):
+        logger.info("No local cl100k_base file for tiktoken; estimating token counts")
+        return None
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", cache_dir)
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        logger.warning("Loading tiktoken's cl100k_base failed; estimating token counts", exc_info=True)
+        return None
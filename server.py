@@ -0,0 +1,339 @@
+"""ASGI service exposing the comment engine over HTTP.
+
+    uvicorn server:app --port 8000
+
+Routes:
+    GET  /personas          persona catalog (defaults and custom agents), filtered by ?tag=
+    POST /agents            spawn a custom agent: {"name", "tone", "goal"}
+    POST /comments          generate comments: {"content", "personas", "num_comments", "batched", "fresh"}
+    POST /comments/stream   same, streamed as server-sent events, one "comment" event per finished comment
+    POST /replies           reply in a thread: {"content", "comment_author", "comment_text", "user_reply", "agent", "thread"}
+    GET  /metrics           Prometheus metrics for every call in the process
+    GET  /healthz
+
+Callers pass their Groq key as `Authorization: Bearer <key>` (or the server
+uses GROQ_API_KEY). One engine, registry and LLM client is kept per key and
+shared by every request using it. Work runs on a shared thread pool; when
+YAPYARD_MAX_PENDING jobs are already queued or running, new ones get 429.
+Comments are only read from and written to the result cache for requests
+sent with "fresh": false.
+"""
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+os.environ.setdefault("YAPYARD_CACHE_DIR", "./.yapyard_cache")
+# "live" uses the caller's Groq key; "synthetic" or "replay" serve offline (no key needed)
+os.environ.setdefault("YAPYARD_LLM_MODE", "live")
+
+from agents import AgentRegistry
+from cache import ResultCache, SummaryCache, content_hash
+from comment_engine import CommentEngine, create_comment_engine
+from llm_backends import create_llm
+from metrics import PROCESS_METRICS
+from utils import calculate_heat_rating
+
+MAX_PENDING_JOBS = int(os.environ.get("YAPYARD_MAX_PENDING", "32"))
+WORKER_THREADS = int(os.environ.get("YAPYARD_WORKERS", "8"))
+MAX_BODY_BYTES = 1 << 20
+# Suggested wait sent with 429 responses
+RETRY_AFTER_SECONDS = 5
+MAX_COMMENTS_PER_REQUEST = 50
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[List[Tuple[bytes, bytes]]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or []
+
+
+class JobSlots:
+    """Non-blocking counter of queued and running jobs; a full house is answered with 429"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self.pending >= self.limit:
+                raise HTTPError(429, "Too many requests in flight, retry later.",
+                                [(b"retry-after", str(RETRY_AFTER_SECONDS).encode())])
+            self.pending += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self.pending -= 1
+
+
+class CommentService:
+    """Engines per API key, the shared worker pool and the job limit"""
+
+    def __init__(self, max_pending: int = MAX_PENDING_JOBS, workers: int = WORKER_THREADS):
+        self.llm_mode = os.environ["YAPYARD_LLM_MODE"]
+        self.slots = JobSlots(max_pending)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="yapyard-api")
+        cache_dir = os.environ["YAPYARD_CACHE_DIR"]
+        self.summary_cache = SummaryCache(path=os.path.join(cache_dir, "summaries.sqlite"))
+        self.result_cache = ResultCache(path=os.path.join(cache_dir, "results.sqlite"))
+        self._engines: Dict[str, CommentEngine] = {}
+        self._lock = threading.Lock()
+
+    def engine_for(self, api_key: Optional[str]) -> CommentEngine:
+        """Engine shared by every request using the same key (one per process offline)"""
+        if self.llm_mode == "live" and not api_key:
+            raise HTTPError(401, "Pass a Groq API key as 'Authorization: Bearer <key>'.")
+        key = content_hash(api_key or "") if self.llm_mode == "live" else self.llm_mode
+        with self._lock:
+            if key not in self._engines:
+                llm = None
+                if self.llm_mode != "live":
+                    llm = create_llm(self.llm_mode, api_key=api_key, cassette_path=os.environ.get("YAPYARD_CASSETTE"),
+                                     fallback_to_synthetic=True)
+                self._engines[key] = create_comment_engine(
+                    AgentRegistry(api_key=api_key, llm=llm),
+                    backend=os.environ.get("YAPYARD_ENGINE", "crew"),
+                    summary_cache=self.summary_cache,
+                    result_cache=self.result_cache
+                )
+            return self._engines[key]
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run blocking engine work on the pool, holding a job slot until it finishes"""
+        self.slots.acquire()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.slots.release()
+
+
+def _api_key(headers: Dict[str, str]) -> Optional[str]:
+    authorization = headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:].strip() or None
+    return os.environ.get("GROQ_API_KEY")
+
+
+def _require(payload: Dict, name: str, kind: type = str) -> Any:
+    value = payload.get(name)
+    if not isinstance(value, kind) or (kind is str and not value.strip()):
+        raise HTTPError(400, f"'{name}' is required and must be a {'non-empty string' if kind is str else kind.__name__}.")
+    return value
+
+
+def _comment_request(engine: CommentEngine, payload: Dict) -> Dict:
+    """Validate a comments request into iter_comments keyword arguments"""
+    names = engine.agent_registry.get_agent_names()
+    personas = payload.get("personas") or names
+    if not isinstance(personas, list) or not all(isinstance(p, str) for p in personas):
+        raise HTTPError(400, "'personas' must be a list of persona names.")
+    unknown = [p for p in personas if p not in names]
+    if unknown:
+        raise HTTPError(400, f"Unknown personas: {', '.join(unknown)}")
+    num_comments = payload.get("num_comments", 5)
+    if isinstance(num_comments, bool) or not isinstance(num_comments, int) \
+            or not 1 <= num_comments <= MAX_COMMENTS_PER_REQUEST:
+        raise HTTPError(400, f"'num_comments' must be an integer from 1 to {MAX_COMMENTS_PER_REQUEST}.")
+    deadline = payload.get("deadline")
+    if deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, (int, float)) or deadline <= 0):
+        raise HTTPError(400, "'deadline' must be a positive number of seconds.")
+    return {
+        "content": _require(payload, "content"),
+        "selected_agents": personas,
+        "num_comments": num_comments,
+        "batched": bool(payload.get("batched", False)),
+        "fresh": bool(payload.get("fresh", True)),
+        "deadline": deadline,
+    }
+
+
+async def _read_json(receive) -> Dict:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(400, "Client disconnected.")
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large.")
+        if not message.get("more_body"):
+            break
+    if not body:
+        return {}
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, "Request body must be JSON.")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "Request body must be a JSON object.")
+    return payload
+
+
+async def _send(send, status: int, body: bytes, content_type: bytes = b"application/json",
+                headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())] + (headers or [])})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, status: int, payload: Any, headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+    await _send(send, status, json.dumps(payload, ensure_ascii=False).encode(), headers=headers)
+
+
+def _sse(event: str, data: Any) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+
+async def _stream_comments(service: CommentService, engine: CommentEngine, request: Dict, receive, send) -> None:
+    """Stream comments as SSE while a pool thread drives iter_comments
+
+    A client disconnect stops the generator and cancels the requests that are
+    still waiting on the model.
+    """
+    service.slots.acquire()
+    loop = asyncio.get_running_loop()
+    events: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue()
+    stop = threading.Event()
+
+    def produce() -> None:
+        stream = engine.iter_comments(**request, cancel=stop)
+        comments = []
+        try:
+            for slot, comment in stream:
+                if stop.is_set():
+                    break
+                comments.append(comment)
+                loop.call_soon_threadsafe(events.put_nowait, ("comment", {"slot": slot, "comment": comment}))
+            else:
+                loop.call_soon_threadsafe(events.put_nowait, ("done", {
+                    "count": len(comments), "heat_rating": calculate_heat_rating(comments)}))
+        except Exception as e:
+            loop.call_soon_threadsafe(events.put_nowait, ("error", {"error": str(e)}))
+        finally:
+            stream.close()
+            loop.call_soon_threadsafe(events.put_nowait, ("", None))
+
+    async def watch_disconnect() -> None:
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        stop.set()
+        events.put_nowait(("", None))
+
+    worker = loop.run_in_executor(service.executor, produce)
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]})
+        while not stop.is_set():
+            event, data = await events.get()
+            if not event:
+                break
+            await send({"type": "http.response.body", "body": _sse(event, data), "more_body": True})
+        if not stop.is_set():
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        stop.set()
+        watcher.cancel()
+        # The slot is held until the worker has actually stopped
+        worker.add_done_callback(lambda _: service.slots.release())
+
+
+async def _handle(service: CommentService, scope, receive, send) -> None:
+    method, path = scope["method"], scope["path"].rstrip("/") or "/"
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+
+    if path == "/healthz" and method == "GET":
+        return await _send_json(send, 200, {"status": "ok", "pending_jobs": service.slots.pending})
+    if path == "/metrics" and method == "GET":
+        return await _send(send, 200, PROCESS_METRICS.to_prometheus().encode(), b"text/plain; version=0.0.4")
+
+    routes = {("GET", "/personas"), ("POST", "/agents"), ("POST", "/comments"),
+              ("POST", "/comments/stream"), ("POST", "/replies")}
+    if (method, path) not in routes:
+        status = 405 if path in {p for _, p in routes} else 404
+        raise HTTPError(status, "Method not allowed." if status == 405 else "Not found.")
+
+    engine = service.engine_for(_api_key(headers))
+    registry = engine.agent_registry
+
+    if path == "/personas":
+        tag = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("tag", [None])[0]
+        names = registry.names_with_tag(tag) if tag else registry.get_agent_names()
+        personas = []
+        for name in names:
+            persona = registry.get_persona(name)
+            personas.append({"name": name, "custom": name in registry.custom_personas, "tags": list(persona.tags)})
+        return await _send_json(send, 200, {"personas": personas})
+
+    payload = await _read_json(receive)
+
+    if path == "/agents":
+        name, tone, goal = _require(payload, "name"), _require(payload, "tone"), _require(payload, "goal")
+        await service.run(registry.spawn_agent, name, tone, goal)
+        return await _send_json(send, 201, {"name": name, "custom": True})
+
+    if path == "/replies":
+        agent = _require(payload, "agent")
+        if agent not in registry.get_all_agents():
+            raise HTTPError(400, f"Unknown persona: {agent}")
+        thread = payload.get("thread") or []
+        if not isinstance(thread, list) or not all(
+                isinstance(turn, dict) and isinstance(turn.get("author"), str) and isinstance(turn.get("text"), str)
+                for turn in thread):
+            raise HTTPError(400, "'thread' must be a list of replies with string 'author' and 'text'.")
+        reply = await service.run(lambda: engine.generate_reply(
+            _require(payload, "content"), _require(payload, "comment_author"), _require(payload, "comment_text"),
+            _require(payload, "user_reply"), agent, thread=thread
+        ))
+        return await _send_json(send, 200, reply)
+
+    request = _comment_request(engine, payload)
+    if path == "/comments/stream":
+        return await _stream_comments(service, engine, request, receive, send)
+    comments = await service.run(lambda: engine.generate_comments(
+        request["content"], request["selected_agents"], request["num_comments"],
+        batched=request["batched"], fresh=request["fresh"], deadline=request["deadline"]
+    ))
+    return await _send_json(send, 200, {"comments": comments, "heat_rating": calculate_heat_rating(comments)})
+
+
+class CommentAPI:
+    """The ASGI application; the service (engines, pool) is created on first request"""
+
+    def __init__(self):
+        self._service: Optional[CommentService] = None
+
+    @property
+    def service(self) -> CommentService:
+        if self._service is None:
+            self._service = CommentService()
+        return self._service
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    if self._service is not None:
+                        self._service.executor.shutdown(wait=False, cancel_futures=True)
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        try:
+            await _handle(self.service, scope, receive, send)
+        except HTTPError as e:
+            await _send_json(send, e.status, {"error": str(e)}, e.headers)
+        except Exception as e:
+            await _send_json(send, 500, {"error": f"{type(e).__name__}: {e}"})
+
+
+app = CommentAPI()
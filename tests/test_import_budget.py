@@ -0,0 +1,40 @@
+import importlib.util
+import os
+import unittest
+
+BENCHMARK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              "benchmarks", "import_budget.py")
+
+
+def load_import_budget():
+    spec = importlib.util.spec_from_file_location("import_budget", BENCHMARK_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@unittest.skipUnless(importlib.util.find_spec("streamlit") and importlib.util.find_spec("dotenv"),
+                     "the startup imports need Streamlit and python-dotenv installed")
+class StartupImportBudgetTest(unittest.TestCase):
+    """app.py's own startup imports stay within the budget and leave the LLM stack unloaded"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.import_budget = load_import_budget()
+        cls.cumulative, cls.imported = cls.import_budget.measure_import_time()
+
+    def test_covers_app_startup_modules(self):
+        self.assertIn("comment_engine", self.import_budget.STARTUP_MODULES)
+        self.assertIn("prewarm", self.import_budget.STARTUP_MODULES)
+
+    def test_no_heavy_modules_at_startup(self):
+        leaked = sorted(set(self.import_budget.HEAVY_MODULES) & self.imported)
+        self.assertEqual(leaked, [], f"heavy modules imported at startup: {', '.join(leaked)}")
+
+    def test_within_budget(self):
+        total_ms = sum(self.cumulative.values()) / 1000
+        self.assertLessEqual(total_ms, self.import_budget.DEFAULT_BUDGET_MS)
+
+
+if __name__ == "__main__":
+    unittest.main()
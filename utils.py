@@ -1,5 +1,7 @@
 import re
-from typing import Dict, List
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional
 
 
 def format_content_preview(content: str, max_length: int = 100) -> str:
@@ -8,32 +10,138 @@ def format_content_preview(content: str, max_length: int = 100) -> str:
         return content
     return content[:max_length] + "..."
 
-def calculate_heat_rating(comments: List[Dict]) -> int:
-    """Calculate a heat rating based on comment sentiment"""
-    if not comments:
+# Emotional words and their heat weights; extend per deployment with HeatScanner.add_words
+DEFAULT_HEAT_LEXICON: Dict[str, int] = {
+    'amazing': 1,
+    'terrible': 1,
+    'love': 1,
+    'hate': 1,
+    'wow': 1,
+    'omg': 1,
+    'wtf': 1,
+}
+
+# Comments are scored this many at a time, so a stream of any length is held in bounded memory
+HEAT_CHUNK_SIZE = 4096
+
+# Joins a chunk into one string; every non-word character, this one included, bounds words
+_SEPARATOR = '\x00'
+_JOINER = f' {_SEPARATOR} '
+# Every ASCII non-word character becomes a space; the rest of Unicode goes through _NON_ASCII_NON_WORD
+_ASCII_NON_WORD = str.maketrans({char: ' ' for char in map(chr, range(1, 128)) if not (char.isalnum() or char == '_')})
+_NON_ASCII_NON_WORD = re.compile(r'[^\x00-\x7f\w]')
+
+def _words_only(text: str) -> str:
+    """`text` with every character but letters, digits, '_' and the chunk separator replaced by a space"""
+    text = text.translate(_ASCII_NON_WORD)
+    return text if text.isascii() else _NON_ASCII_NON_WORD.sub(' ', text)
+
+class HeatScanner:
+    """Scores comment heat against a weighted lexicon
+    
+    A chunk of comments is lowercased and has every non-word character
+    turned into a space in one pass over the joined text, so a whole-word
+    hit is a plain substring test for " word ": "love" does not fire inside
+    "glove". Each lexicon entry counts at most once per comment, and so does
+    '!' however many there are.
+    """
+    
+    def __init__(self, lexicon: Optional[Dict[str, int]] = None, exclamation_weight: int = 1,
+                 long_comment_chars: int = 100, max_comment_heat: int = 5):
+        self.lexicon = dict(DEFAULT_HEAT_LEXICON if lexicon is None else lexicon)
+        self.exclamation_weight = exclamation_weight
+        self.long_comment_chars = long_comment_chars
+        self.max_comment_heat = max_comment_heat
+        self._compile()
+    
+    def _compile(self):
+        entries = []
+        for word, weight in self.lexicon.items():
+            # Multi-word entries match with any single non-word character between their words
+            words = _words_only(word.lower()).split()
+            if not words:
+                raise ValueError(f"Heat lexicon entry {word!r} has no word characters")
+            entries.append((f" {' '.join(words)} ", weight))
+        self._entries = tuple(entries)
+    
+    def add_words(self, words: Dict[str, int]):
+        """Add or re-weight lexicon entries"""
+        self.lexicon.update(words)
+        self._compile()
+    
+    def comment_heat(self, text: str) -> int:
+        """Heat of one comment: 1 base, +1 if long, + weight of each distinct hit, capped"""
+        return self._heats([text])[0]
+    
+    def rate_texts(self, texts: Iterable[str]) -> int:
+        """Batch API: heat rating (0-10) over any number of comment texts, streamed"""
+        texts = iter(texts)
+        total_heat = 0
+        count = 0
+        while True:
+            chunk = list(islice(texts, HEAT_CHUNK_SIZE))
+            if not chunk:
+                return _scale_heat(total_heat, count)
+            total_heat += sum(self._heats(chunk))
+            count += len(chunk)
+    
+    def _heats(self, texts: List[str]) -> List[int]:
+        """Capped heat of each comment; every way of rating comments scores through here"""
+        padded_texts = _words_only(f" {_JOINER.join(texts)} ".lower()).split(_SEPARATOR)
+        if len(padded_texts) != len(texts):
+            # A comment held the separator itself
+            return self._heats([text.replace(_SEPARATOR, ' ') for text in texts])
+        entries, long_chars = self._entries, self.long_comment_chars
+        exclamation, cap = self.exclamation_weight, self.max_comment_heat
+        heats = []
+        for text, padded in zip(texts, padded_texts):
+            heat = 2 if len(text) > long_chars else 1  # Base heat, +1 for longer comments
+            if '!' in text:
+                heat += exclamation
+            for word, weight in entries:
+                if word in padded:
+                    heat += weight
+            heats.append(heat if heat < cap else cap)  # Cap individual comment heat
+        return heats
+
+DEFAULT_HEAT_SCANNER = HeatScanner()
+
+def _scale_heat(total_heat: int, count: int) -> int:
+    """Average per-comment heat and scale to 1-10 (0 for no comments)"""
+    if not count:
         return 0
+    return min(int(total_heat / count * 2), 10)
+
+class HeatAccumulator:
+    """Running heat rating and stats that update in O(1) per new comment"""
+    
+    def __init__(self, scanner: Optional[HeatScanner] = None):
+        self.scanner = scanner or DEFAULT_HEAT_SCANNER
+        self.total_heat = 0
+        self.total_chars = 0
+        self.count = 0
+    
+    def add(self, comment: Dict):
+        text = comment['text']
+        self.total_heat += self.scanner.comment_heat(text)
+        self.total_chars += len(text)
+        self.count += 1
     
-    # Simple heuristic based on comment length and certain keywords
-    total_heat = 0
-    for comment in comments:
-        text = comment['text'].lower()
-        heat = 1  # Base heat
-        
-        # Increase heat for longer comments
-        if len(text) > 100:
-            heat += 1
-        
-        # Increase heat for emotional words
-        emotional_words = ['amazing', 'terrible', 'love', 'hate', 'wow', 'omg', 'wtf', '!', '!!!']
-        for word in emotional_words:
-            if word in text:
-                heat += 1
-        
-        total_heat += min(heat, 5)  # Cap individual comment heat at 5
-    
-    # Average and scale to 1-10
-    avg_heat = total_heat / len(comments)
-    return min(int(avg_heat * 2), 10)
+    def extend(self, comments: Iterable[Dict]):
+        for comment in comments:
+            self.add(comment)
+    
+    @property
+    def rating(self) -> int:
+        return _scale_heat(self.total_heat, self.count)
+    
+    @property
+    def average_length(self) -> int:
+        return self.total_chars // self.count if self.count else 0
+
+def calculate_heat_rating(comments: List[Dict]) -> int:
+    """Calculate a heat rating based on comment sentiment"""
+    return DEFAULT_HEAT_SCANNER.rate_texts(map(itemgetter('text'), comments))
 
 def get_toxicity_level(heat_rating: int) -> str:
     """Convert heat rating to toxicity description"""